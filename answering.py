@@ -0,0 +1,141 @@
+import os
+import logging
+from langchain_openai import ChatOpenAI
+from langchain_openai.chat_models.base import _convert_delta_to_message_chunk
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from dotenv import load_dotenv
+from vector_store import get_vector_db, keep_store_open
+from retrieval import retrieve, build_context, RETRIEVAL_MAX_K, RETRIEVAL_MAX_K_WITH_STYLE_PROFILE
+from prompts import (format_question_prompt, build_follow_up_messages,
+                     build_answer_messages as build_persona_answer_messages)
+from telemetry import timed, llm_call_telemetry
+
+# Load environment variables
+load_dotenv()
+
+# One chat turn for a persona: retrieval, prompt, answer, follow-up and references. Kept out of
+# app.py so it can be used without Streamlit (see benchmarks/).
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingUsageChatOpenAI(ChatOpenAI):
+    # ChatOpenAI whose streamed completions report token usage (and so the prompt cache hit rate).
+    # OpenAI sends it in a last chunk without choices when asked to, which ChatOpenAI._stream drops;
+    # here it is passed on as the generation's token_usage for LLMCallTelemetry.
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        message_dicts, params = self._create_message_dicts(messages, stop)
+        params = {**params, **kwargs, "stream": True, "stream_options": {"include_usage": True}}
+
+        default_chunk_class = AIMessageChunk
+        for chunk in self.client.create(messages=message_dicts, **params):
+            if not isinstance(chunk, dict):
+                chunk = chunk.model_dump()
+            if len(chunk["choices"]) == 0:
+                if chunk.get("usage"):
+                    yield ChatGenerationChunk(message=default_chunk_class(content=""),
+                                              generation_info={"token_usage": chunk["usage"]})
+                continue
+            choice = chunk["choices"][0]
+            message = _convert_delta_to_message_chunk(choice["delta"], default_chunk_class)
+            generation_info = {}
+            if finish_reason := choice.get("finish_reason"):
+                generation_info["finish_reason"] = finish_reason
+            default_chunk_class = message.__class__
+            generation_chunk = ChatGenerationChunk(message=message, generation_info=generation_info or None)
+            if run_manager:
+                run_manager.on_llm_new_token(generation_chunk.text, chunk=generation_chunk)
+            yield generation_chunk
+
+
+def get_chat_model():
+    # The chat model used for answers, follow-ups and conversation memory
+    return StreamingUsageChatOpenAI(
+        model_name="gpt-4.1",
+        temperature=0.7,
+        openai_api_key=os.getenv("OPENAI_API_KEY"),
+        # None for api.openai.com, or an OpenAI-compatible endpoint such as python -m mock_servers
+        openai_api_base=os.getenv("OPENAI_BASE_URL"),
+        callbacks=[llm_call_telemetry]
+    )
+
+
+def generate_prompt(user_message, selected_user, query_embedding=None):
+    chroma_path = selected_user.chroma_path
+    logger.debug("chroma_path: %s", chroma_path)
+
+    with timed("retrieval", {"persona": selected_user.name}) as span, keep_store_open(chroma_path):
+        # Prepare the VectorDB (opened once per process and shared across sessions).
+        vector_db = get_vector_db(chroma_path)
+
+        # Search the VectorDB (and the lexical index), reusing the question embedding if the caller
+        # already computed it, and keep only the hits that are relevant to the question.
+        max_k = RETRIEVAL_MAX_K_WITH_STYLE_PROFILE if selected_user.style_profile else RETRIEVAL_MAX_K
+        results, num_candidates = retrieve(vector_db, chroma_path, user_message, query_embedding, max_k)
+        span.set_attributes({"retrieval.candidates": num_candidates, "retrieval.results": len(results)})
+    logger.info("Results: %s of %s candidates, scores: %s", len(results), num_candidates,
+                [round(score, 3) for _doc, score in results])
+    if not results:
+        # Nothing in the timeline is about this, answer in style only instead of padding the prompt
+        logger.info("Unable to find matching results.")
+        return format_question_prompt(user_message), results, ""
+
+    with timed("prompt_assembly") as span:
+        context_text, results, context_stats = build_context(results)
+        prompt = format_question_prompt(user_message, context_text)
+        span.set_attributes({f"context.{key}": value for key, value in context_stats.items()})
+    logger.info("Context: %s tokens from %s tweets, %s tokens saved (%s near-duplicates, %s over budget)",
+                context_stats['tokens'], context_stats['documents'], context_stats['tokens_saved'],
+                context_stats['duplicates'], context_stats['over_budget'])
+    logger.debug("prompt: %s", prompt)
+    return prompt, results, context_text
+
+
+def build_answer_messages(question, selected_user, query_embedding=None, history_messages=None):
+    # question should be standalone (see ChatMemory.rewrite_question), the conversation so far is
+    # passed separately as the compressed history_messages
+    answer_with_RAG, search_results, context_text = generate_prompt(question, selected_user, query_embedding)
+
+    # Persona first, so the prompt prefix is the same on every turn
+    messages = build_persona_answer_messages(selected_user.persona, answer_with_RAG, history_messages,
+                                             selected_user.style_profile)
+
+    logger.debug("messages: %s", messages)
+    return messages, search_results
+
+
+def generate_answer(chat, question, selected_user, query_embedding=None, history_messages=None):
+    messages, search_results = build_answer_messages(question, selected_user, query_embedding, history_messages)
+
+    # Get AI response
+    response = chat.invoke(messages, config={"run_name": "answer"})
+    return response.content, search_results
+
+
+def stream_answer(chat, messages):
+    # Yield the completion token by token, for st.write_stream
+    for chunk in chat.stream(messages, config={"run_name": "answer"}):
+        yield chunk.content
+
+
+def generate_follow_ups(chat, question):
+    follow_up_response = chat.invoke(build_follow_up_messages(question), config={"run_name": "follow_up"})
+    return follow_up_response.content
+
+
+def get_references(search_results, selected_user):
+    # Extract references from search results
+    references = []
+    for doc, score in search_results:
+        if hasattr(doc, 'metadata') and 'source' in doc.metadata:
+            if 'type' not in doc.metadata or doc.metadata['type'] == 'TW':  # Only posts from Twitter has open ref. Old import don't have 'type':
+                ref = f"{selected_user.twitter_post_url_prefix}/status/{doc.metadata['source']}"
+                references.append(ref)
+            elif  doc.metadata['type'] == 'FC': # Farcaster not open
+                ref = f"Farcaster: {doc.metadata['source']}"
+                references.append(ref)
+        else:
+            references.append("Source document")
+    return references
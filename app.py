@@ -1,17 +1,25 @@
 import streamlit as st
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain.schema import HumanMessage, SystemMessage
-import os
+import logging
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain.prompts import ChatPromptTemplate
 import time
-from models import User, get_pgsql_db, STATUS_FULLY_IMPORTED, get_users, insert_new_user_to_pgsql_db
+from concurrent.futures import ThreadPoolExecutor
+from models import (User, STATUS_FULLY_IMPORTED, get_users,
+                    JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, JOB_STATUS_DONE, JOB_STATUS_FAILED)
+from jobs import submit_import_job, get_recent_import_jobs
 from sqlalchemy.orm import Session
 import requests
 import json
 from langchain.schema import Document
 import shutil
+from vector_store import get_vector_db
+from chat_memory import ChatMemory
+from answering import (get_chat_model, build_answer_messages, generate_answer, stream_answer,
+                       generate_follow_ups, get_references)
+from response_cache import RESPONSE_CACHE_ENABLED, normalize_question, lookup_response, store_response
+from telemetry import configure_telemetry, record_duration, timed
+
+configure_telemetry()
+logger = logging.getLogger(__name__)
 
 def gate_by_invite_code():
     # 1. Define valid invite codes
@@ -44,66 +52,19 @@ if 'selected_user' not in st.session_state:
 if 'import_status' not in st.session_state:
     st.session_state.import_status = ""
 
-# Initialize the chat model
-def get_chat_model():
-    return ChatOpenAI(
-        model_name="gpt-4.1",
-        temperature=0.7,
-        openai_api_key=os.getenv("OPENAI_API_KEY")
-    )
-
-# PROMPT_TEMPLATE = """
-# Provide a direct response mimicking my style based on the timeline content:\nEthereum\n\n\n\nNFT\n\n\n\nOpensea \n\nand include only the response itself without any additional text.\n\n\n\n\nAnswer the question based on the above context:  web3?\n
-# """
-PROMPT_TEMPLATE = """
-Provide a direct response mimicking my style based on the timeline content:
-{context} 
-
-and include only the response itself without any additional text.
-
-
----
-
-Answer the question based on the above context:  {question}
-"""
-
-FOLLOW_UP_PROMPT = """
-What else should I ask about this: 
-{context}
-
-Generate 1 relevant follow-up question that would help the user learn more about this topic. 
-Format each question that starts with "Would you like to know more about...".
-Make the questions specific and related to the context.
-"""
-
-
-def generate_prompt(user_message, selected_user):
-    chroma_path = selected_user.chroma_path
-    print(f"chroma_path: {chroma_path}")
-
-    # Prepare the VectorDB.
-    embedding_function = OpenAIEmbeddings()
-    vector_db = Chroma(persist_directory=chroma_path, embedding_function=embedding_function)
-
-    # Search the VectorDB.
-    results = vector_db.similarity_search_with_relevance_scores(user_message, k=20)
-    print(f"Results: {results}")
-    if len(results) == 0 or results[0][1] < 0.7:
-        print(f"Unable to find matching results.")
-
-    context_text = "\n\n---\n\n".join([doc.page_content for doc, _score in results])
-    prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE)
-    prompt = prompt_template.format(context=context_text, question=user_message)
-    # print(f"prompt: {prompt}")
-    return prompt, results, context_text
+JOB_STATUS_LABELS = {
+    JOB_STATUS_QUEUED: "queued",
+    JOB_STATUS_RUNNING: "importing",
+    JOB_STATUS_DONE: "done",
+    JOB_STATUS_FAILED: "failed",
+}
 
 # Initialize chat history
 if 'messages' not in st.session_state:
     st.session_state.messages = []
-
-# Get database session
-pgsql_db = next(get_pgsql_db())
-# users = get_users(pgsql_db)
+if 'chat_memory' not in st.session_state:
+    st.session_state.chat_memory = ChatMemory()
+    st.session_state.chat_memory_user_id = None
 
 # Sidebar for user selection and import
 with st.sidebar:
@@ -114,44 +75,35 @@ with st.sidebar:
     twitter_handle = st.text_input("Enter Twitter handle (without @)", key="twitter_handle")
     if st.button("Import User"):
         if twitter_handle:
-            # Clear any existing progress bars and text areas
-            st.empty()  # Clear any existing content
-            st.empty()  # Clear any existing content
-            st.empty()  # Clear any existing content
-            
-            # Create progress bars with labels
-            st.write("Twitter Import Progress:")
-            progress_bar_tw = st.progress(0)
-            st.write("Farcaster Import Progress:")
-            progress_bar_fc = st.progress(0)
-            status_text = st.empty()
-            
-            # Try to insert new user
-            result = insert_new_user_to_pgsql_db(twitter_handle, status_text, progress_bar_tw, progress_bar_fc)
-            
-            if result.startswith("User successfully added"):
-                # Update final status
-                status_text.text(f"Successfully imported data for @{twitter_handle}!")
-                progress_bar_fc.progress(100)
-                
-                # Store final status
-                st.session_state.import_status = result
-            else:
-                # Show error message
-                status_text.text(result)
-                st.session_state.import_status = result
+            # Imports run on background workers, so this session (and chat for everyone else) is not blocked
+            job_id = submit_import_job(twitter_handle)
+            st.session_state.import_status = f"Import of @{twitter_handle} queued (job #{job_id})"
         else:
             st.session_state.import_status = "Please enter a Twitter handle"
     
     # Display import status
     if st.session_state.import_status:
         st.text_area("Import Status", value=st.session_state.import_status, height=100, disabled=True)
+
+    # Progress of recent import jobs, read back from the job table
+    import_jobs = get_recent_import_jobs()
+    if import_jobs:
+        for job in import_jobs:
+            st.write(f"@{job.twitter_handle} — {JOB_STATUS_LABELS.get(job.status, job.status)}")
+            if job.status in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING):
+                st.caption("Twitter Import Progress:")
+                st.progress(job.twitter_progress)
+                st.caption("Farcaster Import Progress:")
+                st.progress(job.farcaster_progress)
+            if job.status_message:
+                st.caption(job.status_message)
+        st.button("Refresh import progress")
     
     st.divider()
     
     # User selection
     st.subheader("Select User")
-    users = get_users(pgsql_db)
+    users = get_users()
     if not users:
         st.warning("No fully imported users available. Please import a user first.")
     else:
@@ -173,6 +125,9 @@ with st.sidebar:
                 st.image(users[st.session_state.selected_user].avatar, width=40)
             st.markdown("</div>", unsafe_allow_html=True)
 
+    # Render persona replies token by token instead of waiting for the whole completion
+    st.toggle("Stream responses", value=True, key="stream_responses")
+
 
 # Main chat interface
 st.title("AI Chat Interface")
@@ -192,6 +147,7 @@ for message in st.session_state.messages:
 
 # Chat input
 if question := st.chat_input("What would you like to ask?"):
+    turn_started = time.perf_counter()
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": question})
     
@@ -201,59 +157,79 @@ if question := st.chat_input("What would you like to ask?"):
     
     # Get selected user's persona
     selected_user = users[st.session_state.selected_user]
-    
+
     # Initialize chat model
     chat = get_chat_model()
 
-    answer_with_RAG, search_results, context_text = generate_prompt(question, selected_user)
-    # print(f"prompt_with_RAG: {prompt_with_RAG}")
+    # The conversation memory belongs to one persona, start over when another one is selected
+    memory = st.session_state.chat_memory
+    if st.session_state.chat_memory_user_id != selected_user.id:
+        memory = st.session_state.chat_memory = ChatMemory()
+        st.session_state.chat_memory_user_id = selected_user.id
+
+    # Follow-ups like "why?" are rewritten with the conversation so far before anything is looked up
+    standalone_question = memory.rewrite_question(chat, question)
+
+    # Look for a previous answer to a near-identical question for this persona
+    query_embedding = None
+    cached_response = None
+    if RESPONSE_CACHE_ENABLED:
+        # Embed with the model the persona's store was built with, so the vector can be reused for retrieval
+        query_embeddings = get_vector_db(selected_user.chroma_path).embeddings
+        with timed("query_embedding"):
+            query_embedding = query_embeddings.embed_query(normalize_question(standalone_question))
+        with timed("response_cache_lookup"):
+            cached_response = lookup_response(selected_user.id, selected_user.persona, query_embedding,
+                                              query_embeddings.model)
 
-    # Create system message with persona
-    system_message = SystemMessage(content=selected_user.persona)
-    human_message = HumanMessage(content=answer_with_RAG)
-    
-    print(f"system_message: {system_message}\n\n")
-    print(f"human_message: {human_message}\n\n")
-    
-    # Get AI response
-    response = chat.invoke([system_message, human_message])
-    print(f"Response: {response.content}\n")
-    
-    # Generate follow-up questions
-    follow_up_prompt = FOLLOW_UP_PROMPT.format(context=question)
-    follow_up_response = chat.invoke([SystemMessage(content="You are a helpful assistant that generates relevant follow-up questions."), 
-                                    HumanMessage(content=follow_up_prompt)])
-    # print(f"follow_up_prompt: {follow_up_prompt}\n\n")
-    # print(f"follow_up_response: {follow_up_response}\n\n")
-    follow_up_questions = follow_up_response.content
-    print(f"Follow ups: {follow_up_questions}\n\n")
-    
-    # Extract references from search results
-    references = []
-    for doc, score in search_results:
-        if hasattr(doc, 'metadata') and 'source' in doc.metadata:
-            if 'type' not in doc.metadata or doc.metadata['type'] == 'TW':  # Only posts from Twitter has open ref. Old import don't have 'type':
-                ref = f"{selected_user.twitter_post_url_prefix}/status/{doc.metadata['source']}"
-                references.append(ref)
-            elif  doc.metadata['type'] == 'FC': # Farcaster not open
-                ref = f"Farcaster: {doc.metadata['source']}"
-                references.append(ref)
+    # Display AI response with references and follow-up questions
+    with st.chat_message("assistant"):
+        if cached_response:
+            logger.info("Response cache hit for: %s", question)
+            answer = cached_response["answer"]
+            references = cached_response["references"]
+            follow_up_questions = cached_response["follow_ups"]
+            st.write(answer)
         else:
-            references.append("Source document")
-    
+            # The follow-up only depends on the question, so run it alongside retrieval + answer
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                follow_up_future = executor.submit(generate_follow_ups, chat, standalone_question)
+
+                history_messages = memory.history_messages()
+                if st.session_state.stream_responses:
+                    messages, search_results = build_answer_messages(standalone_question, selected_user, query_embedding,
+                                                                     history_messages)
+                    # Render tokens as they arrive, returns the full text once done
+                    answer = st.write_stream(stream_answer(chat, messages))
+                else:
+                    answer, search_results = generate_answer(chat, standalone_question, selected_user, query_embedding,
+                                                             history_messages)
+                    st.write(answer)
+
+                follow_up_questions = follow_up_future.result()
+
+            references = get_references(search_results, selected_user)
+            if query_embedding is not None:
+                store_response(selected_user.id, selected_user.persona, standalone_question, query_embedding,
+                               query_embeddings.model, answer, references, follow_up_questions)
+
+        # st.markdown("**Follow-up Question:**")
+        st.write(follow_up_questions)
+        st.markdown("**References:**")
+        for ref in references:
+            st.markdown(f"- {ref}")
+
+    logger.debug("Response: %s", answer)
+    logger.debug("Follow ups: %s", follow_up_questions)
+    record_duration("chat_turn", time.perf_counter() - turn_started, {"cached": bool(cached_response)})
+
+    # Remember the turn; once there are more than a few, the oldest is folded into the summary
+    memory.add_turn(chat, question, answer)
+
     # Add AI response to chat history with references and follow-up questions
     st.session_state.messages.append({
         "role": "assistant", 
-        "content": response.content,
+        "content": answer,
         "references": references,
         "follow_ups": follow_up_questions
     })
-
-    # Display AI response with references and follow-up questions
-    with st.chat_message("assistant"):
-        st.write(response.content)
-        # st.markdown("**Follow-up Question:**")
-        st.write(follow_up_questions)
-        st.markdown("**References:**")
-        for ref in references:
-            st.markdown(f"- {ref}")
\ No newline at end of file
@@ -0,0 +1,58 @@
+import os
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from benchmarks.harness import configure, build_store, make_persona, check_retrieval, format_latencies
+
+# End-to-end chat turn latency as app.py runs it (question rewrite, retrieval, streamed answer with
+# the follow-up in parallel, memory update), against a fake chat model with a set response time.
+#   python -m benchmarks.bench_chat_turn [--size 5000] [--turns 30] [--first-token 0.3] [--token 0.01]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=5000, help="Posts in the persona store")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--first-token", type=float, default=0.3, help="Fake model time to first token, seconds")
+    parser.add_argument("--token", type=float, default=0.01, help="Fake model time per token, seconds")
+    args = parser.parse_args()
+
+    work_dir = configure()
+    from answering import build_answer_messages, stream_answer, generate_follow_ups
+    from chat_memory import ChatMemory
+    from benchmarks.fakes import FakeChatModel
+    from benchmarks.bench_retrieval import QUESTIONS
+
+    chroma_path = os.path.join(work_dir, "chat")
+    build_store(chroma_path, args.size)
+    persona = make_persona(chroma_path)
+    check_retrieval(persona, QUESTIONS)
+    chat = FakeChatModel(first_token_latency=args.first_token, token_latency=args.token)
+    memory = ChatMemory()
+    rng = random.Random(0)
+
+    first_token_samples, turn_samples = [], []
+    for _ in range(args.turns):
+        question = rng.choice(QUESTIONS)
+        started = time.perf_counter()
+        standalone_question = memory.rewrite_question(chat, question)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            follow_up_future = executor.submit(generate_follow_ups, chat, standalone_question)
+            messages, _search_results = build_answer_messages(standalone_question, persona, None, memory.history_messages())
+            chunks = []
+            for chunk in stream_answer(chat, messages):
+                if not chunks:
+                    first_token_samples.append(time.perf_counter() - started)
+                chunks.append(chunk)
+            follow_up_future.result()
+        turn_samples.append(time.perf_counter() - started)
+        memory.add_turn(chat, question, "".join(chunks))
+
+    print(f"{args.turns} turns, {args.size} posts, fake model {args.first_token * 1000:.0f} ms to first token")
+    print(f"time to first token  {format_latencies(first_token_samples)}")
+    print(f"full turn            {format_latencies(turn_samples)}")
+
+
+if __name__ == "__main__":
+    main()
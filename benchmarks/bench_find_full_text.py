@@ -0,0 +1,96 @@
+import time
+import argparse
+import tracemalloc
+from mock_servers.payloads import load_pages, make_timeline_pages
+from benchmarks.fixtures import TWITTER_PAGES_DIR, recorded_pages_dir
+from crawlers.import_twitter import find_full_text_with_ids
+
+# Microbenchmark: tweet extraction from timeline pages, the previous recursive extractor vs the
+# current iterative one.
+#   python -m benchmarks.bench_find_full_text [--pages DIR_WITH_RECORDED_JSON] [--repeat 20]
+# Pages recorded into benchmarks/pages/twitter (benchmarks/record_pages.py) are used by default.
+
+
+def legacy_find_full_text_with_ids(data, current_id=None, seen=None):
+    # The recursive extractor crawlers/import_twitter.py used before, kept for comparison
+    if seen is None:
+        seen = set()
+
+    results = []
+
+    if isinstance(data, dict):
+        local_id = current_id  # Carry current ID through recursion
+        for key, value in data.items():
+            if key == "rest_id":
+                local_id = value  # Update current ID
+            elif key == "text":  # If the tweet is long, then this API will return a "text" which contains all content
+                if local_id not in seen and value != None and isinstance(value, str) and local_id != None:
+                    seen.add(local_id)
+                    results.append({"metadata": {"source": local_id}, "text": value})
+            elif key == "full_text" and value != None and isinstance(value, str) and local_id != None:
+                if local_id not in seen:
+                    seen.add(local_id)
+                    results.append({"metadata": {"source": local_id}, "text": value})
+            else:
+                results.extend(legacy_find_full_text_with_ids(value, local_id, seen))
+
+    elif isinstance(data, list):
+        for item in data:
+            results.extend(legacy_find_full_text_with_ids(item, current_id, seen))
+
+    return results
+
+
+def extract_legacy(pages):
+    return legacy_find_full_text_with_ids(pages)
+
+
+def extract_current(pages):
+    seen = set()
+    return [item for page in pages for item in find_full_text_with_ids(page, seen=seen)]
+
+
+def measure(extract, pages, repeat):
+    # Best wall time over `repeat` runs, then one traced run for peak memory
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        records = extract(pages)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    extract(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return best, peak, records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default=recorded_pages_dir(TWITTER_PAGES_DIR),
+                        help="Directory of recorded /user-tweets responses (*.json), benchmarks/pages/twitter if recorded")
+    parser.add_argument("--num-pages", type=int, default=50, help="Synthetic pages to generate when --pages is not given")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages) if args.pages else make_timeline_pages(args.num_pages)
+    print(f"{len(pages)} pages")
+
+    results = {}
+    for name, extract in (("recursive (old)", extract_legacy), ("iterative (new)", extract_current)):
+        best, peak, records = measure(extract, pages, args.repeat)
+        results[name] = records
+        print(f"{name:16}  {best * 1000:8.2f} ms  {best / len(pages) * 1e6:8.1f} us/page  "
+              f"peak {peak / 1024:8.1f} KiB  {len(records)} tweets")
+
+    old = {item["metadata"]["source"]: item["text"] for item in results["recursive (old)"]}
+    new = {item["metadata"]["source"]: item["text"] for item in results["iterative (new)"]}
+    print(f"same tweet ids: {old.keys() == new.keys()} (old only: {len(old.keys() - new.keys())}, new only: {len(new.keys() - old.keys())})")
+    # The recursive walk also matches "text" keys of hashtag entities, which come before full_text
+    changed = [tweet_id for tweet_id in old.keys() & new.keys() if old[tweet_id] != new[tweet_id]]
+    print(f"different texts: {len(changed)}, e.g. {[old[tweet_id] for tweet_id in changed[:3]]} (old)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import time
+import asyncio
+import argparse
+from benchmarks.harness import configure
+from benchmarks.fixtures import TWITTER_PAGES_DIR, FARCASTER_PAGES_DIR, recorded_pages_dir
+
+# Import throughput: Twitter and Farcaster imports replayed from recorded or synthetic pages, with
+# fake embeddings, through the real fetch -> embed + upsert pipeline.
+#   python -m benchmarks.bench_import [--pages DIR] [--num-pages 50] [--cast-pages 20] [--latency 0.2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", default=recorded_pages_dir(TWITTER_PAGES_DIR),
+                        help="Directory of recorded /user-tweets responses (*.json), benchmarks/pages/twitter if recorded")
+    parser.add_argument("--casts", default=recorded_pages_dir(FARCASTER_PAGES_DIR),
+                        help="Directory of recorded Farcaster timeline responses (*.json), benchmarks/pages/farcaster if recorded")
+    parser.add_argument("--num-pages", type=int, default=50, help="Synthetic timeline pages when --pages is not given")
+    parser.add_argument("--cast-pages", type=int, default=20, help="Synthetic Farcaster pages when --casts is not given")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated API round trip per request, in seconds")
+    args = parser.parse_args()
+
+    work_dir = configure()
+    from mock_servers.payloads import load_pages, make_timeline_pages, make_cast_pages
+    from benchmarks.replay import ReplayTransport
+    from crawlers.fetcher import Fetcher
+    from crawlers.import_twitter import import_twitter_data_async
+    from crawlers.import_farcaster import import_farcaster_data_async
+    from crawlers.pipeline import get_pipeline_stats
+    from embeddings import get_embedding_function
+
+    timeline_pages = load_pages(args.pages) if args.pages else make_timeline_pages(args.num_pages)
+    cast_pages = load_pages(args.casts) if args.casts else make_cast_pages(args.cast_pages)
+    transport = ReplayTransport(timeline_pages, cast_pages, latency=args.latency)
+    chroma_path = os.path.join(work_dir, "import")
+
+    async def import_all():
+        # Both crawlers share one fetcher, as in models.insert_new_user_to_pgsql_db
+        async with Fetcher(transport=transport) as fetcher:
+            return await asyncio.gather(
+                import_twitter_data_async("25073877", chroma_path, fetcher=fetcher),
+                import_farcaster_data_async("5650", chroma_path, fetcher=fetcher),
+            )
+
+    started = time.perf_counter()
+    (num_tweets, _newest_tweet_id), num_casts = asyncio.run(import_all())
+    elapsed = time.perf_counter() - started
+
+    stats = get_pipeline_stats()
+    embedding_stats = get_embedding_function().get_stats()
+    total = num_tweets + num_casts
+    print(f"{len(timeline_pages)} timeline pages, {len(cast_pages)} cast pages, {transport.requests} requests, "
+          f"{args.latency * 1000:.0f} ms simulated latency")
+    print(f"imported {total} docs ({num_tweets} tweets, {num_casts} casts) in {elapsed:.2f}s: {total / elapsed:.1f} docs/s")
+    # Stage times are busy time summed over both imports, the stages overlap in wall time
+    # Tweets and casts are extracted while each page streams in, so fetch includes parsing
+    print(f"fetch  {stats['pages']:6} pages {stats['fetch_seconds']:8.2f}s  {stats['pages'] / max(stats['fetch_seconds'], 1e-9):10.1f} pages/s  "
+          f"({stats['docs_fetched']} docs)")
+    print(f"save   {stats['docs_saved']:6} docs  {stats['save_seconds']:8.2f}s  {stats['docs_saved'] / max(stats['save_seconds'], 1e-9):10.1f} docs/s")
+    print(f"embedding service: {embedding_stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import time
+import random
+import argparse
+from benchmarks.harness import configure, build_store, make_persona, check_retrieval, format_latencies
+
+# Retrieval latency of answering.generate_prompt() (vector search, relevance gating, BM25 fusion and
+# context assembly) on stores of growing size, with fake embeddings.
+#   python -m benchmarks.bench_retrieval [--sizes 1000,10000] [--queries 50]
+
+QUESTIONS = [
+    "What do you think about $ETH?", "gm", "Are rollups the future of ethereum?", "Tell me about vitalik.eth",
+    "Which wallet do you use?", "Is defi still early?", "What are frames on farcaster?", "Any airdrop today?",
+    "How do you feel about NFT communities?", "What should I build onchain?", "zk or optimistic?", "#web3 or not?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,10000", help="Comma separated store sizes, in posts")
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    work_dir = configure()
+    from answering import generate_prompt
+
+    rng = random.Random(0)
+    for size in (int(size) for size in args.sizes.split(",")):
+        chroma_path = os.path.join(work_dir, f"store-{size}")
+        started = time.perf_counter()
+        build_store(chroma_path, size)
+        print(f"store of {size} posts built in {time.perf_counter() - started:.1f}s")
+
+        persona = make_persona(chroma_path)
+        check_retrieval(persona, QUESTIONS)  # Also opens the store and loads its index
+
+        samples = []
+        for _ in range(args.queries):
+            question = rng.choice(QUESTIONS)
+            started = time.perf_counter()
+            generate_prompt(question, persona)
+            samples.append(time.perf_counter() - started)
+        print(f"generate_prompt  {size:8} posts  {format_latencies(samples)}")
+
+
+if __name__ == "__main__":
+    main()
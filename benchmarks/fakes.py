@@ -0,0 +1,56 @@
+import re
+import time
+from typing import Any, Iterator, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from mock_servers.payloads import hash_embedding
+
+# Stand-ins for the OpenAI embedding and chat APIs, so benchmarks run offline and measure our code.
+
+
+class HashEmbeddings(Embeddings):
+    # The mock OpenAI server's hashed bag-of-words vectors, without the server. The model name is
+    # the dimension.
+
+    def __init__(self, model="256"):
+        self.model = f"hash-{model}"
+        self.dimension = int(model)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [hash_embedding(text, self.dimension) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return hash_embedding(text, self.dimension)
+
+
+class FakeChatModel(BaseChatModel):
+    # Answers with a fixed text after a simulated time to first token, then one token per
+    # token_latency. Reports token usage like the OpenAI API does.
+    reply: str = "gm, building is the way. " * 8
+    first_token_latency: float = 0.3
+    token_latency: float = 0.01
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _tokens(self):
+        return re.findall(r"\S+\s*", self.reply)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens()
+        time.sleep(self.first_token_latency + self.token_latency * len(tokens))
+        prompt_tokens = sum(len(str(message.content).split()) for message in messages)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=self.reply))],
+            llm_output={"token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                                        "prompt_tokens_details": {"cached_tokens": 0}}},
+        )
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
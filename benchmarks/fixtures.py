@@ -0,0 +1,25 @@
+import os
+import random
+from mock_servers.payloads import random_words
+
+# Posts for filling benchmark stores directly, and where recorded API pages are kept (see
+# benchmarks/record_pages.py). Synthetic API pages come from mock_servers.payloads.
+PAGES_DIR = os.path.join(os.path.dirname(__file__), "pages")
+TWITTER_PAGES_DIR = os.path.join(PAGES_DIR, "twitter")
+FARCASTER_PAGES_DIR = os.path.join(PAGES_DIR, "farcaster")
+
+
+def recorded_pages_dir(directory):
+    # directory if pages were recorded into it, otherwise None (synthetic pages are used)
+    if os.path.isdir(directory) and any(name.endswith(".json") for name in os.listdir(directory)):
+        return directory
+    return None
+
+
+def make_posts(num_posts, seed=0):
+    # [{"metadata": ..., "text": ...}] as the crawlers produce them
+    rng = random.Random(seed)
+    return [
+        {"metadata": {"source": str(1900000000000000000 - i), "type": "TW"}, "text": random_words(rng, rng.randint(5, 40))}
+        for i in range(num_posts)
+    ]
@@ -0,0 +1,83 @@
+import os
+import tempfile
+from types import SimpleNamespace
+from mock_servers.server import TWITTER_PREFIX, FIREFLY_PREFIX
+
+# Shared setup for the offline benchmarks. configure() must run before any app module is imported,
+# since they read their settings from the environment at import time.
+
+FAKE_EMBEDDING_MODEL = "fake:256"
+REPLAY_BASE_URL = "http://replay"
+
+
+def configure(work_dir=None):
+    # Everything goes to a scratch directory; embeddings are fake and API rate limits are lifted
+    work_dir = work_dir or tempfile.mkdtemp(prefix="ai_persona_bench_")
+    os.environ.update({
+        "EMBEDDING_MODEL": FAKE_EMBEDDING_MODEL,
+        "EMBEDDING_CACHE_PATH": os.path.join(work_dir, "embedding_cache"),
+        "VECTOR_STORE_MODE": "directory",
+        "RESPONSE_CACHE_ENABLED": "false",
+        # Hash vectors of a few words score lower than real embeddings, even by cosine (see build_store)
+        "RETRIEVAL_MIN_SCORE": "0.25",
+        "TWITTER_API_RATE": "10000",
+        "FARCASTER_API_RATE": "10000",
+        "DEFAULT_API_RATE": "10000",
+        # The stand-ins accept any key
+        "RAPID_API_KEY": "bench",
+        "FARCASTER_AUTH_TOKEN": "bench",
+        # Crawler requests are answered in-process by the stand-ins (see benchmarks/replay.py)
+        "TWITTER_API_BASE_URL": REPLAY_BASE_URL + TWITTER_PREFIX,
+        "FIREFLY_API_BASE_URL": REPLAY_BASE_URL + FIREFLY_PREFIX,
+    })
+
+    from embeddings import EMBEDDING_PROVIDERS, LOCAL_EMBEDDING_PROVIDERS
+    from benchmarks.fakes import HashEmbeddings
+    EMBEDDING_PROVIDERS["fake"] = HashEmbeddings
+    LOCAL_EMBEDDING_PROVIDERS.add("fake")
+    return work_dir
+
+
+def build_store(chroma_path, num_posts, seed=0, batch_size=500):
+    # Fill a persona store through the same upsert path the crawlers use
+    from langchain.schema import Document
+    from crawlers.chroma_utils import save_to_chroma
+    from benchmarks.fixtures import make_posts
+    from vector_store import get_chroma_client, get_collection_name
+
+    # Compared by cosine: in Chroma's default l2 space the relevance of hash vectors goes negative
+    get_chroma_client(chroma_path).get_or_create_collection(
+        get_collection_name(chroma_path), metadata={"embedding_model": FAKE_EMBEDDING_MODEL, "hnsw:space": "cosine"}
+    )
+    posts = make_posts(num_posts, seed)
+    for start in range(0, num_posts, batch_size):
+        docs = [Document(page_content=post["text"], metadata=post["metadata"]) for post in posts[start:start + batch_size]]
+        save_to_chroma(chroma_path, docs)
+
+
+def check_retrieval(persona, questions):
+    # Timings only mean something if every question takes the whole path (vector search, BM25
+    # fusion, context assembly) instead of returning early without context
+    from answering import generate_prompt
+    empty = [question for question in questions if not generate_prompt(question, persona)[1]]
+    if empty:
+        raise SystemExit(f"No documents retrieved for {empty}, the benchmark would time an empty path")
+
+
+def make_persona(chroma_path, style_profile=None):
+    # Has the attributes of models.User that answering.py reads
+    return SimpleNamespace(
+        id=0, name="bench", chroma_path=chroma_path, style_profile=style_profile,
+        persona="You are a builder in the Ethereum community.", twitter_post_url_prefix="https://x.com/bench",
+    )
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def format_latencies(samples):
+    return (f"p50 {percentile(samples, 50) * 1000:8.1f} ms  p95 {percentile(samples, 95) * 1000:8.1f} ms  "
+            f"p99 {percentile(samples, 99) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms  (n={len(samples)})")
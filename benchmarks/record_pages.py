@@ -0,0 +1,71 @@
+import os
+import json
+import asyncio
+import argparse
+from benchmarks.fixtures import PAGES_DIR
+
+# Records raw API responses as benchmark fixtures: a user's /user-tweets pages and Farcaster timeline
+# pages, one *.json file per page, requested the way the crawlers request them. Needs RAPID_API_KEY
+# and FARCASTER_AUTH_TOKEN, and the live APIs unless the base URLs point elsewhere.
+#   python -m benchmarks.record_pages --twitter-id 295218901 --fid 5650 [--pages 20] [--out benchmarks/pages]
+# The benchmarks replay the pages under benchmarks/pages/ when they are there.
+
+
+def _save(directory, index, page):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{index:03d}.json"), "w") as f:
+        json.dump(page, f)
+
+
+async def record_timeline(fetcher, twitter_id, num_pages, directory):
+    from crawlers.fetcher import TWITTER_API_BASE_URL
+    headers = {"X-RapidAPI-Key": os.getenv("RAPID_API_KEY"), "X-RapidAPI-Host": "twitter241.p.rapidapi.com"}
+    params = {"user": twitter_id, "count": 20}
+    for index in range(num_pages):
+        page = await fetcher.get_json(f"{TWITTER_API_BASE_URL}/user-tweets", headers=headers, params=params)
+        _save(directory, index, page)
+        cursor = (page.get("cursor") or {}).get("bottom")
+        if not cursor:
+            return index + 1
+        params["cursor"] = cursor
+    return num_pages
+
+
+async def record_casts(fetcher, fid, num_pages, directory):
+    from crawlers.fetcher import FIREFLY_API_BASE_URL
+    headers = {"authorization": os.getenv("FARCASTER_AUTH_TOKEN"), "content-type": "application/json"}
+    body = {"fids": [fid]}
+    for index in range(num_pages):
+        page = await fetcher.request_json("POST", f"{FIREFLY_API_BASE_URL}/v2/user/timeline/farcaster", headers=headers, json=body)
+        _save(directory, index, page)
+        cursor = (page.get("data") or {}).get("cursor")
+        if not cursor:
+            return index + 1
+        body["cursor"] = cursor
+    return num_pages
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--twitter-id", help="Twitter user id whose timeline is recorded")
+    parser.add_argument("--fid", help="Farcaster fid whose casts are recorded")
+    parser.add_argument("--pages", type=int, default=20, help="Pages to record per timeline")
+    parser.add_argument("--out", default=PAGES_DIR, help="Pages go to OUT/twitter and OUT/farcaster")
+    args = parser.parse_args()
+
+    from crawlers.fetcher import Fetcher
+
+    async def record():
+        async with Fetcher() as fetcher:
+            if args.twitter_id:
+                count = await record_timeline(fetcher, args.twitter_id, args.pages, os.path.join(args.out, "twitter"))
+                print(f"recorded {count} timeline pages")
+            if args.fid:
+                count = await record_casts(fetcher, args.fid, args.pages, os.path.join(args.out, "farcaster"))
+                print(f"recorded {count} cast pages")
+
+    asyncio.run(record())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import httpx
+from mock_servers.faults import Faults
+from mock_servers.server import create_app
+
+# An httpx transport that answers the crawlers' API calls in-process with the mock_servers
+# stand-ins, from recorded (or synthetic) pages, so imports can be benchmarked offline with the real
+# fetch/save code. The crawler base URLs must point at it, benchmarks.harness.configure() does.
+
+
+class ReplayTransport(httpx.ASGITransport):
+
+    def __init__(self, timeline_pages=(), cast_pages=(), latency=0.0):
+        # latency: seconds added to every response, to stand in for the API round trip
+        self.faults = [Faults(latency), Faults(latency)]
+        super().__init__(app=create_app(*self.faults, timeline_pages=list(timeline_pages), cast_pages=list(cast_pages)))
+
+    @property
+    def requests(self):
+        return sum(faults.stats["requests"] for faults in self.faults)
@@ -0,0 +1,53 @@
+import os
+import asyncio
+import argparse
+from benchmarks.harness import configure
+
+# Smoke check for the stand-ins: looks up a few handles on the mock Twitter API the way
+# models.insert_new_user_to_pgsql_db does, checks the ids fit users.twitter_id (an Integer column),
+# then imports their tweets and casts through the real crawlers. Exits non-zero on the first problem.
+#   python -m benchmarks.smoke_mock_import [--handles vitalikbuterin suji_yan] [--num-pages 3]
+
+MAX_TWITTER_ID = 2 ** 31 - 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handles", nargs="+", default=["vitalikbuterin", "suji_yan", "heyibinance"])
+    parser.add_argument("--num-pages", type=int, default=3, help="Synthetic timeline and cast pages per user")
+    args = parser.parse_args()
+
+    work_dir = configure()
+    from mock_servers.payloads import make_timeline_pages, make_cast_pages
+    from benchmarks.replay import ReplayTransport
+    from crawlers.fetcher import Fetcher, TWITTER_API_BASE_URL
+    from crawlers.import_twitter import import_twitter_data_async
+    from crawlers.import_farcaster import checkUserHasFarcasterAsync, import_farcaster_data_async
+
+    transport = ReplayTransport(make_timeline_pages(args.num_pages), make_cast_pages(args.num_pages))
+
+    async def import_handle(fetcher, handle):
+        data = await fetcher.get_json(f"{TWITTER_API_BASE_URL}/user", params={"username": handle})
+        tw_user_id = data["result"]["data"]["user"]["result"]["rest_id"]
+        if not 0 < int(tw_user_id) <= MAX_TWITTER_ID:
+            raise SystemExit(f"@{handle}: twitter id {tw_user_id} does not fit users.twitter_id")
+
+        chroma_path = os.path.join(work_dir, handle)
+        num_tweets, _newest_tweet_id = await import_twitter_data_async(tw_user_id, chroma_path, fetcher=fetcher)
+        fid = await checkUserHasFarcasterAsync(tw_user_id, fetcher)
+        num_casts = await import_farcaster_data_async(fid, chroma_path, fetcher=fetcher) if fid else 0
+        if not num_tweets or not num_casts:
+            raise SystemExit(f"@{handle}: imported {num_tweets} tweets and {num_casts} casts")
+        print(f"@{handle}: twitter id {tw_user_id}, fid {fid}, {num_tweets} tweets, {num_casts} casts")
+
+    async def import_all():
+        async with Fetcher(transport=transport) as fetcher:
+            for handle in args.handles:
+                await import_handle(fetcher, handle)
+
+    asyncio.run(import_all())
+    print(f"ok, {transport.requests} requests")
+
+
+if __name__ == "__main__":
+    main()
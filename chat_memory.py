@@ -0,0 +1,95 @@
+import os
+import logging
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from dotenv import load_dotenv
+from retrieval import count_tokens, truncate_tokens
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Conversation memory per chat session: the last MEMORY_RECENT_TURNS turns verbatim (each message
+# capped at MEMORY_TURN_TOKENS), older turns folded into a summary of at most MEMORY_SUMMARY_TOKENS.
+# The prompt therefore stays the same size however long the conversation gets.
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "2"))
+MEMORY_TURN_TOKENS = int(os.getenv("MEMORY_TURN_TOKENS", "300"))
+MEMORY_SUMMARY_TOKENS = int(os.getenv("MEMORY_SUMMARY_TOKENS", "300"))
+
+SUMMARY_PROMPT = """
+Summary of the conversation so far:
+{summary}
+
+New exchange:
+User: {question}
+Assistant: {answer}
+
+Update the summary with the new exchange. Keep the topics, names and facts that later questions may refer to.
+Write at most {max_words} words and include only the summary itself.
+"""
+
+REWRITE_PROMPT = """
+Conversation so far:
+{history}
+
+Follow-up question: {question}
+
+Rewrite the follow-up question as a standalone question that can be understood without the conversation.
+If it already is one, return it unchanged. Include only the question itself.
+"""
+
+
+class ChatMemory:
+
+    def __init__(self):
+        self.summary = ""
+        self.recent_turns = []  # [(question, answer)], oldest first
+
+    def is_empty(self):
+        return not self.summary and not self.recent_turns
+
+    def _history_text(self):
+        lines = [f"Earlier: {self.summary}"] if self.summary else []
+        for question, answer in self.recent_turns:
+            lines.append(f"User: {question}")
+            lines.append(f"Assistant: {answer}")
+        return "\n".join(lines)
+
+    def rewrite_question(self, chat, question):
+        # Turn "why?" into a question retrieval can work with. No model call on the first turn.
+        if self.is_empty():
+            return question
+        response = chat.invoke([
+            SystemMessage(content="You rewrite follow-up questions so they can be searched on their own."),
+            HumanMessage(content=REWRITE_PROMPT.format(history=self._history_text(), question=question)),
+        ], config={"run_name": "rewrite_question"})
+        standalone_question = response.content.strip() or question
+        logger.debug("Standalone question: %s", standalone_question)
+        return standalone_question
+
+    def history_messages(self):
+        # The compressed history, to go between the persona and the new question
+        messages = []
+        if self.summary:
+            messages.append(SystemMessage(content=f"Summary of the conversation so far: {self.summary}"))
+        for question, answer in self.recent_turns:
+            messages.append(HumanMessage(content=question))
+            messages.append(AIMessage(content=answer))
+        return messages
+
+    def add_turn(self, chat, question, answer):
+        self.recent_turns.append((truncate_tokens(question, MEMORY_TURN_TOKENS), truncate_tokens(answer, MEMORY_TURN_TOKENS)))
+        while len(self.recent_turns) > MEMORY_RECENT_TURNS:
+            self._fold_into_summary(chat, *self.recent_turns.pop(0))
+
+    def _fold_into_summary(self, chat, question, answer):
+        response = chat.invoke([
+            SystemMessage(content="You keep a short running summary of a conversation."),
+            HumanMessage(content=SUMMARY_PROMPT.format(
+                summary=self.summary or "(empty)", question=question, answer=answer,
+                max_words=MEMORY_SUMMARY_TOKENS * 3 // 4
+            )),
+        ], config={"run_name": "summarize_history"})
+        # The word limit is only a request, the token limit is enforced here
+        self.summary = truncate_tokens(response.content.strip(), MEMORY_SUMMARY_TOKENS)
+        logger.debug("Conversation summary (%s tokens): %s", count_tokens(self.summary), self.summary)
@@ -0,0 +1,52 @@
+import logging
+from langchain.schema import Document
+from vector_store import open_vector_db
+from lexical_index import get_path_lock, has_lexical_index, index_documents, build_lexical_index
+
+logger = logging.getLogger(__name__)
+
+
+def get_document_id(doc: Document):
+    # Stable id per post, so writing the same tweet/cast twice updates it instead of duplicating it
+    return f"{doc.metadata.get('type', 'TW')}-{doc.metadata['source']}"
+
+
+def save_to_chroma(CHROMA_PATH, docs: list[Document], embedding_model=None) -> int:
+    # Upsert documents into the persona store without touching what is already there.
+    # embedding_model only applies when the store does not exist yet.
+    # Returns how many documents were new.
+    if not docs:
+        return 0
+
+    # Twitter and Farcaster imports of one persona write to the same store concurrently, and a chat
+    # turn may be building its lexical index
+    with get_path_lock(CHROMA_PATH):
+        return _save_to_chroma(CHROMA_PATH, docs, embedding_model)
+
+
+def _save_to_chroma(CHROMA_PATH, docs: list[Document], embedding_model=None) -> int:
+    # Open with the store's embedding model, backed by the local embedding cache so unchanged posts are not re-embedded
+    db = open_vector_db(CHROMA_PATH, embedding_model, for_documents=True)
+
+    # Skip posts already in the store (older imports used random ids, so match on 'source')
+    sources = list({doc.metadata["source"] for doc in docs})
+    existing = db.get(where={"source": {"$in": sources}}, include=["metadatas"])
+    existing_sources = {metadata["source"] for metadata in existing["metadatas"] if "source" in metadata}
+
+    # Dedupe within the batch as well
+    new_docs = {}
+    for doc in docs:
+        if doc.metadata["source"] not in existing_sources:
+            new_docs[get_document_id(doc)] = doc
+
+    if new_docs:
+        db.add_documents(list(new_docs.values()), ids=list(new_docs.keys()))
+        # Keep the persona's BM25 index in step; a store imported before it existed is indexed in full.
+        # Stores with their own full-text index (pgvector) index new rows themselves.
+        if not hasattr(db, "search_lexical"):
+            if has_lexical_index(CHROMA_PATH):
+                index_documents(CHROMA_PATH, list(new_docs.keys()), list(new_docs.values()))
+            else:
+                build_lexical_index(CHROMA_PATH, db)
+    logger.info("Saved %s new chunks to %s.", len(new_docs), CHROMA_PATH)
+    return len(new_docs)
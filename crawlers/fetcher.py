@@ -0,0 +1,143 @@
+import os
+import logging
+import random
+import asyncio
+import threading
+import httpx
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from crawlers.json_stream import iter_json_items
+from rate_limit import TokenBucket
+from telemetry import timed
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# API endpoints; point them at local stand-ins (python -m mock_servers) for offline load tests
+TWITTER_API_BASE_URL = os.getenv("TWITTER_API_BASE_URL", "https://twitter241.p.rapidapi.com").rstrip("/")
+FIREFLY_API_BASE_URL = os.getenv("FIREFLY_API_BASE_URL", "https://api-dev.firefly.land").rstrip("/")
+
+# Allowed requests per second for each API, shared by every import running in this process
+RATE_LIMITS = {
+    TWITTER_API_BASE_URL: float(os.getenv("TWITTER_API_RATE", "2")),
+    FIREFLY_API_BASE_URL: float(os.getenv("FARCASTER_API_RATE", "1")),
+}
+DEFAULT_RATE_LIMIT = float(os.getenv("DEFAULT_API_RATE", "2"))
+MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", "5"))
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(url):
+    # One bucket per API (base URL), other hosts get one each at the default rate
+    api = next((base_url for base_url in RATE_LIMITS if url.startswith(base_url + "/")), None)
+    key = api or urlparse(url).netloc
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(RATE_LIMITS.get(api, DEFAULT_RATE_LIMIT))
+        return _buckets[key]
+
+
+def _retry_delay(attempt, response=None):
+    # Honour Retry-After when the API sends it, otherwise exponential backoff with jitter
+    if response is not None and response.headers.get("retry-after"):
+        try:
+            return float(response.headers["retry-after"])
+        except ValueError:
+            pass
+    return min(30, 2 ** attempt) + random.random()
+
+
+def _without_unset_headers(kwargs):
+    # Headers set to None (an API key missing from .env) are left out, as requests did; httpx rejects them
+    headers = kwargs.get("headers")
+    if headers:
+        kwargs = {**kwargs, "headers": {name: value for name, value in headers.items() if value is not None}}
+    return kwargs
+
+
+class Fetcher:
+    # One keep-alive HTTP client per import run, rate limited per API host
+
+    def __init__(self, transport: httpx.AsyncBaseTransport = None):
+        # transport replaces the network, e.g. to replay recorded responses (see benchmarks/replay.py)
+        self.client = httpx.AsyncClient(timeout=30, transport=transport)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.client.aclose()
+
+    async def request_json(self, method, url, **kwargs):
+        kwargs = _without_unset_headers(kwargs)
+        host = urlparse(url).hostname
+        bucket = get_bucket(url)
+
+        # One span per page, covering rate limit waits and retries
+        with timed("fetch", {"http.host": host, "http.method": method}) as span:
+            for attempt in range(MAX_RETRIES + 1):
+                span.set_attribute("fetch.attempts", attempt + 1)
+                await bucket.acquire()
+                try:
+                    response = await self.client.request(method, url, **kwargs)
+                except httpx.TransportError as e:
+                    if attempt == MAX_RETRIES:
+                        raise
+                    delay = _retry_delay(attempt)
+                    logger.warning("Request to %s failed (%s), retrying in %.1fs", url, e, delay)
+                    await asyncio.sleep(delay)
+                    continue
+
+                span.set_attribute("http.status_code", response.status_code)
+                if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                    delay = _retry_delay(attempt, response)
+                    logger.warning("Request to %s returned %s, retrying in %.1fs", url, response.status_code, delay)
+                    await asyncio.sleep(delay)
+                    continue
+
+                # Out of retries, or not worth retrying (401, 403, 404): an error body is not a page
+                response.raise_for_status()
+                return response.json()
+
+    async def stream_json_items(self, method, url, prefixes, **kwargs):
+        # Like request_json, but the body is parsed while it downloads and only the values at the
+        # given ijson prefixes are yielded, as (prefix, value). The full page is never held in memory.
+        kwargs = _without_unset_headers(kwargs)
+        host = urlparse(url).hostname
+        bucket = get_bucket(url)
+
+        # The span also covers the time the caller spends on each value, parsing overlaps the download
+        with timed("fetch", {"http.host": host, "http.method": method, "fetch.streamed": True}, current=False) as span:
+            for attempt in range(MAX_RETRIES + 1):
+                span.set_attribute("fetch.attempts", attempt + 1)
+                await bucket.acquire()
+                started = False
+                delay = None
+                try:
+                    async with self.client.stream(method, url, **kwargs) as response:
+                        span.set_attribute("http.status_code", response.status_code)
+                        if response.status_code in RETRY_STATUS_CODES and attempt < MAX_RETRIES:
+                            delay = _retry_delay(attempt, response)
+                            logger.warning("Request to %s returned %s, retrying in %.1fs", url, response.status_code, delay)
+                        else:
+                            response.raise_for_status()
+                            async for item in iter_json_items(response.aiter_bytes(), prefixes):
+                                started = True
+                                yield item
+                            return
+                except httpx.TransportError as e:
+                    # Values already handed out cannot be taken back, so only retry before the first one
+                    if started or attempt == MAX_RETRIES:
+                        raise
+                    delay = _retry_delay(attempt)
+                    logger.warning("Request to %s failed (%s), retrying in %.1fs", url, e, delay)
+
+                await asyncio.sleep(delay)
+
+    async def get_json(self, url, **kwargs):
+        return await self.request_json("GET", url, **kwargs)
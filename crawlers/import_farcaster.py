@@ -1,26 +1,32 @@
 import os
-import time
-import requests
-from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-import shutil
+import logging
 from dotenv import load_dotenv
 from typing import Callable, Optional
+from crawlers.pipeline import run_import_pipeline
+from crawlers.fetcher import Fetcher, FIREFLY_API_BASE_URL
 
 # Load environment variables
 load_dotenv()
 
-def checkUserHasFarcaster(twitter_id: str) -> Optional[str]:
-    url = f"https://api-dev.firefly.land/v2/wallet/profileinfo?twitterId={twitter_id}"
-    print(f"checkUserHasFarcaster - twitter_id: {twitter_id}")
+logger = logging.getLogger(__name__)
+
+# Where casts and the next-page cursor live in a timeline response (ijson prefixes)
+CASTS_PREFIX = "data.casts.item"
+CURSOR_PREFIX = "data.cursor"
+
+async def checkUserHasFarcasterAsync(twitter_id: str, fetcher: Optional[Fetcher] = None) -> Optional[str]:
+    if fetcher is None:
+        async with Fetcher() as fetcher:
+            return await checkUserHasFarcasterAsync(twitter_id, fetcher)
+
+    url = f"{FIREFLY_API_BASE_URL}/v2/wallet/profileinfo?twitterId={twitter_id}"
+    logger.debug("checkUserHasFarcaster - twitter_id: %s", twitter_id)
     headers = {
         "content-type": "application/json"
     }
     
     try:
-        response = requests.get(url, headers=headers)
-        data = response.json()
+        data = await fetcher.get_json(url, headers=headers)
         
         # Check if the response has the expected structure and contains Farcaster profiles
         if (data.get("data") and 
@@ -32,130 +38,91 @@ def checkUserHasFarcaster(twitter_id: str) -> Optional[str]:
             if fid is not None:
                 return str(fid)
             
-            print(f"checkUserHasFarcaster - fid: {fid}")
+            logger.debug("checkUserHasFarcaster - fid: %s", fid)
 
     except Exception as e:
-        print(f"Error checking Farcaster profile: {e}")
+        logger.warning("Error checking Farcaster profile: %s", e)
     
     return None
 
-def import_farcaster_data(fid, CHROMA_PATH, progress_callback: Callable[[int, str], None] = None):
+async def import_farcaster_data_async(fid, CHROMA_PATH, progress_callback: Callable[[int, str], None] = None,
+                                      fetcher: Optional[Fetcher] = None, embedding_model: Optional[str] = None):
+    if fetcher is None:
+        async with Fetcher() as fetcher:
+            return await import_farcaster_data_async(fid, CHROMA_PATH, progress_callback, fetcher, embedding_model)
+
     FARCASTER_AUTH_TOKEN = os.getenv("FARCASTER_AUTH_TOKEN")
     how_many_pages = 50
     META_TYPE = "FC"  # Farcaster
 
     # Configuration
-    url = "https://api-dev.firefly.land/v2/user/timeline/farcaster"
+    url = f"{FIREFLY_API_BASE_URL}/v2/user/timeline/farcaster"
     headers = {
         "authorization": FARCASTER_AUTH_TOKEN,
         "content-type": "application/json"
     }
     count = 20
 
-    # Storage for all pages
-    all_responses = []
-
     # Initial request params
     param = {
         "fids": [fid]
     }
 
-    cursor = None
-
-    for i in range(how_many_pages):
-        if cursor:
-            param["cursor"] = cursor
-
-        print(f"Fetching page {i + 1}...\n\n")
-        response = requests.post(url, headers=headers, json=param)
-
-        data = response.json()
-
-
-        # Process the response using find_text
-        cast_data = find_text(data)
-        if cast_data:
-            all_responses.extend(cast_data)
-
-        # Update progress
-        progress = int((i + 1) / how_many_pages * 100)
-        status = f"Processed {i + 1} pages of casts..."
-        if progress_callback:
-            progress_callback(progress, status)
-
-        # Too fast will get API rate limited
-        time.sleep(1)
-        # Extract next cursor
-        try:
-            cursor = data.get("data", {}).get("cursor")
+    progress = 0
+
+    async def fetch_pages():
+        nonlocal progress
+        cursor = None
+
+        for i in range(how_many_pages):
+            if cursor:
+                param["cursor"] = cursor
+
+            logger.debug("Fetching page %s...", i + 1)
+            # Rate limited per API host by the fetcher, no need to sleep between pages.
+            # The page is parsed as it streams in, only cast hashes/texts and the cursor are kept.
+            records = []
+            cursor = None
+            async for prefix, value in fetcher.stream_json_items("POST", url, (CASTS_PREFIX, CURSOR_PREFIX), headers=headers, json=param):
+                if prefix == CURSOR_PREFIX:
+                    cursor = value
+                else:
+                    record = find_cast_text(value)
+                    if record:
+                        records.append(record)
+
+            # Hand the casts to the embed stage right away
+            yield records
+
+            # Update progress
+            progress = int((i + 1) / how_many_pages * 100)
+            status = f"Processed {i + 1} pages of casts..."
+            if progress_callback:
+                progress_callback(progress, status)
+
+            # Stop when there is no next cursor
             if not cursor:
-                print("No more data or cursor not found.\n\n")
-                print(f"cursor data: {data.get('data', {}).get('cursor')}\n\n")
+                logger.info("No more data or cursor not found.")
                 break
-        except Exception as e:
-            print(f"Error accessing cursor: {e}\n\n")
-            print(f"cursor data: {data.get('data', {}).get('cursor')}\n\n")
-            break
 
-    if progress_callback:
-        progress_callback(progress, "Initializing embeddings, please wait...")
-
-    # Convert JSON to LangChain Documents
-    docs = [
-        Document(page_content=item["text"], metadata=item.get("metadata", {}))
-        for item in all_responses
-    ]
+    def report_saved(status):
+        if progress_callback:
+            progress_callback(progress, status)
 
-    message = save_to_chroma(CHROMA_PATH, docs)
+    # Embed each page's casts while later pages are still downloading
+    num_new_docs = await run_import_pipeline(fetch_pages(), CHROMA_PATH,
+                                             progress_callback=report_saved, embedding_model=embedding_model)
+    message = f"Added {num_new_docs} new documents from Farcaster." if num_new_docs else "No new documents to add."
     if progress_callback:
         progress_callback(progress, message)
 
+    return num_new_docs
 
-def save_to_chroma(CHROMA_PATH, docs: list[Document]):
-    # Initialize embeddings
-    embedding_function = OpenAIEmbeddings()
-    
-    # Check if database exists
-    if os.path.exists(CHROMA_PATH):
-        # Load existing database
-        db = Chroma(persist_directory=CHROMA_PATH, embedding_function=embedding_function)
-        
-        # Get existing document hashes
-        existing_hashes = set()
-        existing_docs = db.get()
-        if existing_docs and 'metadatas' in existing_docs:
-            existing_hashes = {doc['source'] for doc in existing_docs['metadatas'] if 'source' in doc}
-        
-        # Filter out documents that already exist
-        new_docs = [doc for doc in docs if doc.metadata.get('source') not in existing_hashes]
-        
-        if new_docs:
-            # Add only new documents
-            db.add_documents(new_docs)
-            return "Added {len(new_docs)} new documents from Farcaster."
-        else:
-            return "No new documents to add."
-    else:
-        # Create new database if it doesn't exist
-        db = Chroma.from_documents(docs, embedding_function, persist_directory=CHROMA_PATH)
-        return "Created new database with {len(docs)} documents."
-
-def find_text(data):
-    results = []
-    
-    if not isinstance(data, dict):
-        return results
-        
-    # Check if we have the expected data structure
-    if "data" not in data or "casts" not in data["data"]:
-        return results
-        
-    # Process each cast in the response
-    for cast in data["data"]["casts"]:
-        if "hash" in cast and "text" in cast:
-            results.append({
-                "metadata": { "source": cast["hash"], "type": "FC" },
-                "text": cast["text"]
-            })
-    
-    return results 
\ No newline at end of file
+
+def find_cast_text(cast):
+    if "hash" in cast and "text" in cast:
+        return {
+            "metadata": { "source": cast["hash"], "type": "FC" },
+            "text": cast["text"]
+        }
+    return None 
\ No newline at end of file
@@ -1,124 +1,252 @@
 import os
-import time
-import requests
-from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_chroma import Chroma
-import shutil
+import logging
+import re
 from dotenv import load_dotenv
-from typing import Callable
+from typing import Callable, Optional
+from crawlers.pipeline import run_import_pipeline
+from crawlers.fetcher import Fetcher, TWITTER_API_BASE_URL
 
 # Load environment variables
 load_dotenv()
 
-def import_twitter_data(tw_user_id, CHROMA_PATH, progress_callback: Callable[[int, str], None] = None):
+logger = logging.getLogger(__name__)
+
+# Where timeline entries and the next-page cursor live in a /user-tweets response (ijson prefixes)
+TIMELINE_ENTRY_PREFIXES = ("result.timeline.instructions.item.entries.item", "response.result.timeline.instructions.item.entries.item")
+TIMELINE_PIN_PREFIXES = ("result.timeline.instructions.item.entry", "response.result.timeline.instructions.item.entry")
+TIMELINE_CURSOR_PREFIX = "cursor.bottom"
+
+# Timeline entries look like "tweet-<id>" (or "profile-conversation-...-tweet-<id>" inside threads)
+TWEET_ENTRY_ID = re.compile(r"tweet-(\d+)$")
+
+
+def get_timeline_instructions(page) -> list[dict]:
+    result = page.get("result") or page.get("response", {}).get("result") or {}
+    return result.get("timeline", {}).get("instructions", [])
+
+
+def get_timeline_tweet_ids(page) -> list[int]:
+    # Ids of the tweets this timeline page lists, in timeline order. Pinned tweets are skipped
+    # since they are not ordered by time.
+    tweet_ids = []
+    for instruction in get_timeline_instructions(page):
+        if instruction.get("type") != "TimelineAddEntries":
+            continue
+        for entry in instruction.get("entries", []):
+            tweet_ids.extend(get_entry_tweet_ids(entry))
+    return tweet_ids
+
+
+def get_entry_tweet_id(entry) -> Optional[int]:
+    # Id of a top-level "tweet-<id>" entry; None for conversation modules and everything else
+    match = TWEET_ENTRY_ID.match(entry.get("entryId", ""))
+    return int(match.group(1)) if match else None
+
+
+def get_entry_tweet_ids(entry) -> list[int]:
+    # Ids of the entry's tweet and of the tweets of a conversation module
+    entry_ids = [entry.get("entryId", "")]
+    entry_ids += [item.get("entryId", "") for item in entry.get("content", {}).get("items", [])]
+    tweet_ids = []
+    for entry_id in entry_ids:
+        match = TWEET_ENTRY_ID.search(entry_id)
+        if match:
+            tweet_ids.append(int(match.group(1)))
+    return tweet_ids
+
+
+def _iter_entry_tweet_results(entry):
+    # Tweet results of a timeline entry: a single tweet, or the tweets of a conversation module.
+    # Other entries (who-to-follow, cursors, prompts) are skipped without looking inside.
+    content = entry.get("content", {})
+    item_contents = [content.get("itemContent")]
+    item_contents += [item.get("item", {}).get("itemContent") for item in content.get("items", [])]
+    for item_content in item_contents:
+        if item_content and item_content.get("itemType") == "TimelineTweet":
+            result = item_content.get("tweet_results", {}).get("result")
+            if result:
+                yield result
+
+
+def find_full_text_with_ids(page, seen=None):
+    # Yields {"metadata": {"source": <tweet id>}, "text": ...} for every tweet on a timeline page,
+    # including retweeted and quoted tweets. Only the timeline entry paths are visited, user
+    # profiles and other metadata are never walked, and an explicit stack keeps deep payloads safe.
+    if seen is None:
+        seen = set()
+
+    instructions = get_timeline_instructions(page)
+    if not instructions:
+        # Unknown payload shape, fall back to searching the whole page
+        yield from _walk_full_text_with_ids(page, seen)
+        return
+
+    stack = []
+    for instruction in reversed(instructions):
+        if instruction.get("type") == "TimelineAddEntries":
+            entries = instruction.get("entries", [])
+        elif instruction.get("type") == "TimelinePinEntry":
+            entries = [instruction.get("entry", {})]
+        else:
+            continue
+        for entry in reversed(entries):
+            stack.extend(reversed(list(_iter_entry_tweet_results(entry))))
+
+    yield from _iter_tweet_records(stack, seen)
+
+
+def find_entry_full_text_with_ids(entry, seen):
+    # Same as find_full_text_with_ids, for a single timeline entry
+    yield from _iter_tweet_records(list(reversed(list(_iter_entry_tweet_results(entry)))), seen)
+
+
+def _iter_tweet_records(stack, seen):
+    # Pops tweet results off the stack (last = next), pushing retweeted/quoted tweets as it goes
+    while stack:
+        tweet = stack.pop()
+        if tweet.get("__typename") == "TweetWithVisibilityResults":
+            tweet = tweet.get("tweet", {})
+
+        legacy = tweet.get("legacy", {})
+        tweet_id = tweet.get("rest_id")
+        # If the tweet is long, then this API will return a "text" in note_tweet which contains all content,
+        # besides "full_text" which contains truncated content
+        text = tweet.get("note_tweet", {}).get("note_tweet_results", {}).get("result", {}).get("text") or legacy.get("full_text")
+        if tweet_id and isinstance(text, str) and tweet_id not in seen:
+            seen.add(tweet_id)
+            yield {"metadata": {"source": tweet_id}, "text": text}
+
+        # Visit retweeted / quoted tweets after the tweet itself
+        for nested in (legacy.get("quoted_status_result"), tweet.get("quoted_status_result"), legacy.get("retweeted_status_result")):
+            if nested and nested.get("result"):
+                stack.append(nested["result"])
+
+
+def _walk_full_text_with_ids(data, seen):
+    # Generic version of the extractor: walk every dict/list, carrying the nearest "rest_id" down
+    stack = [(data, None)]
+    while stack:
+        node, current_id = stack.pop()
+        if isinstance(node, dict):
+            local_id = node.get("rest_id", current_id)
+            children = []
+            for key, value in node.items():
+                if key in ("text", "full_text"):
+                    if isinstance(value, str) and local_id is not None and local_id not in seen:
+                        seen.add(local_id)
+                        yield {"metadata": {"source": local_id}, "text": value}
+                elif isinstance(value, (dict, list)):
+                    children.append((value, local_id))
+            stack.extend(reversed(children))
+        elif isinstance(node, list):
+            stack.extend((item, current_id) for item in reversed(node))
+
+
+async def stream_timeline_page(fetcher: Fetcher, url, headers, params, seen):
+    # Fetch one timeline page, extracting tweets entry by entry while the body downloads.
+    # Only the records, the timeline tweet ids and the next cursor are kept. top_level_tweet_ids
+    # leaves out conversation modules: a thread is listed by its newest reply, so the ids of its
+    # older tweets say nothing about how far down the timeline the page is.
+    page = {"records": [], "tweet_ids": [], "top_level_tweet_ids": [], "cursor": None}
+    prefixes = TIMELINE_ENTRY_PREFIXES + TIMELINE_PIN_PREFIXES + (TIMELINE_CURSOR_PREFIX,)
+
+    async for prefix, value in fetcher.stream_json_items("GET", url, prefixes, headers=headers, params=params):
+        if prefix == TIMELINE_CURSOR_PREFIX:
+            page["cursor"] = value
+            continue
+        page["records"].extend(find_entry_full_text_with_ids(value, seen))
+        # Pinned tweets are not ordered by time, they do not count for the incremental stop
+        if prefix in TIMELINE_ENTRY_PREFIXES:
+            page["tweet_ids"].extend(get_entry_tweet_ids(value))
+            tweet_id = get_entry_tweet_id(value)
+            if tweet_id is not None:
+                page["top_level_tweet_ids"].append(tweet_id)
+    return page
+
+
+async def import_twitter_data_async(tw_user_id, CHROMA_PATH, progress_callback: Callable[[int, str], None] = None,
+                                    since_tweet_id: Optional[str] = None, fetcher: Optional[Fetcher] = None,
+                                    embedding_model: Optional[str] = None):
+    # Fetches the user's timeline and upserts it into the persona store.
+    # With since_tweet_id (the newest tweet of the previous import) pagination stops as soon as
+    # already imported tweets show up, so a refresh only costs one or two pages.
+    # Returns (number of new documents, newest tweet id seen or since_tweet_id).
+    if fetcher is None:
+        async with Fetcher() as fetcher:
+            return await import_twitter_data_async(tw_user_id, CHROMA_PATH, progress_callback, since_tweet_id, fetcher, embedding_model)
+
     RAPID_API_KEY = os.getenv("RAPID_API_KEY")
     how_many_pages = 50
     count = 20
 
     # Configuration
-    url = "https://twitter241.p.rapidapi.com/user-tweets"
+    url = f"{TWITTER_API_BASE_URL}/user-tweets"
     headers = {
         "X-RapidAPI-Key": RAPID_API_KEY,
         "X-RapidAPI-Host": "twitter241.p.rapidapi.com"
     }
 
-    # Storage for all pages
-    all_responses = []
-
     # Initial request params
     params = {
         "user": tw_user_id,
         "count": count
     }
 
-    cursor = None
-
-    for i in range(how_many_pages):
-        if cursor:
-            params["cursor"] = cursor
-
-        print(f"Fetching page {i + 1}...\n\n")
-        response = requests.get(url, headers=headers, params=params)
-        data = response.json()
-
-        all_responses.append(data)
-
-        # Update progress every 10 pages
-        # if progress_callback and (i + 1) % 10 == 0:
-        progress = int((i + 1) / how_many_pages * 100)
-        status = f"Processed {i + 1} pages of tweets..."
-        progress_callback(progress, status)
+    newest_tweet_id = int(since_tweet_id) if since_tweet_id else None
+    progress = 0
+
+    # Tweets seen on earlier pages, a thread can show up again further down the timeline
+    seen = set()
+
+    async def fetch_pages():
+        nonlocal newest_tweet_id, progress
+        cursor = None
+
+        for i in range(how_many_pages):
+            if cursor:
+                params["cursor"] = cursor
+
+            logger.debug("Fetching page %s...", i + 1)
+            # Rate limited per API host by the fetcher, no need to sleep between pages.
+            # The page is parsed as it streams in, only its tweets are kept.
+            page = await stream_timeline_page(fetcher, url, headers, params, seen)
+
+            # Hand the tweets to the embed stage right away
+            yield page["records"]
+
+            # Update progress every 10 pages
+            # if progress_callback and (i + 1) % 10 == 0:
+            progress = int((i + 1) / how_many_pages * 100)
+            status = f"Processed {i + 1} pages of tweets..."
+            if progress_callback:
+                progress_callback(progress, status)
+
+            # Stop once we reach tweets imported last time: the last imported tweet itself, or a
+            # top-level tweet at least as old
+            tweet_ids = page["tweet_ids"]
+            top_level_tweet_ids = page["top_level_tweet_ids"]
+            if tweet_ids:
+                newest_tweet_id = max(*tweet_ids, newest_tweet_id or 0)
+            if since_tweet_id and (int(since_tweet_id) in tweet_ids or
+                                   (top_level_tweet_ids and min(top_level_tweet_ids) <= int(since_tweet_id))):
+                logger.info("Reached already imported tweet %s, stopping.", since_tweet_id)
+                break
 
-        # Too fast will get API rate limited
-        time.sleep(0.5)
-        # Extract next cursor
-        try:
-            cursor = data.get("cursor", {}).get("bottom")
+            # Extract next cursor
+            cursor = page["cursor"]
             if not cursor:
-                print("No more data or cursor not found.\n\n")
-                print(f"cursor data: {data.get('cursor')}\n\n")
+                logger.info("No more data or cursor not found.")
                 break
-        except Exception as e:
-            print(f"Error accessing cursor: {e}\n\n")
-            print(f"cursor data: {data.get('cursor')}\n\n")
-            break
-
-    def find_full_text_with_ids(data, current_id=None, seen=None):
-        if seen is None:
-            seen = set()
-
-        results = []
-
-        if isinstance(data, dict):
-            local_id = current_id  # Carry current ID through recursion
-            for key, value in data.items():
-                if key == "rest_id":
-                    local_id = value  # Update current ID
-                elif key == "text":  # If the tweet is long, then this API will return a "text" which contains all content
-                    if local_id not in seen and value != None and isinstance(value, str) and local_id != None:
-                        seen.add(local_id)
-                        results.append({"metadata": {"source": local_id}, "text": value})
-                elif key == "full_text" and value != None and isinstance(value, str) and local_id != None:
-                    if local_id not in seen:
-                        seen.add(local_id)
-                        results.append({"metadata": {"source": local_id}, "text": value})
-                else:
-                    results.extend(find_full_text_with_ids(value, local_id, seen))
-
-        elif isinstance(data, list):
-            for item in data:
-                results.extend(find_full_text_with_ids(item, current_id, seen))
-
-        return results
-
-    progress_callback(progress, f"Initializing embeddings, please wait...")
-
-    data = find_full_text_with_ids(all_responses)
-
-    # Convert JSON to LangChain Documents
-    docs = [
-        Document(page_content=item["text"], metadata=item.get("metadata", {}))
-        for item in data
-    ]
-
-    # Initialize embeddings
-    embedding_function = OpenAIEmbeddings()
-
-    print(docs)
-    print("\n\n")
 
-    # Clear out the database first
-    if os.path.exists(CHROMA_PATH):
-        shutil.rmtree(CHROMA_PATH)
+    def report_saved(status):
+        if progress_callback:
+            progress_callback(progress, status)
 
-    # Create a new DB from the documents
-    db = Chroma.from_documents(
-        docs, embedding_function, persist_directory=CHROMA_PATH
-    )
-    print(f"Saved {len(docs)} chunks to {CHROMA_PATH}.")
+    # Upsert into the existing store, keeping previously imported tweets and Farcaster casts
+    num_new_docs = await run_import_pipeline(fetch_pages(), CHROMA_PATH,
+                                             progress_callback=report_saved, embedding_model=embedding_model)
 
     if progress_callback:
-        progress_callback(progress, f"Saved {len(docs)} chunks.")
+        progress_callback(progress, f"Saved {num_new_docs} new chunks.")
 
-    return len(docs) 
\ No newline at end of file
+    return num_new_docs, str(newest_tweet_id) if newest_tweet_id else None
@@ -0,0 +1,41 @@
+import ijson
+from typing import AsyncIterator
+
+
+async def iter_json_items(chunks: AsyncIterator[bytes], prefixes):
+    # Incrementally parse a JSON body as it arrives and yield (prefix, value) for every value found
+    # at one of the ijson prefixes (e.g. "data.casts.item"). Everything else is dropped as soon as it
+    # is parsed, so memory is bounded by the largest selected value rather than the whole body.
+    prefixes = set(prefixes)
+    events = ijson.sendable_list()
+    parser = ijson.parse_coro(events, use_float=True)
+    state = {"builder": None, "prefix": None}
+
+    async for chunk in chunks:
+        parser.send(chunk)
+        for item in _select_items(events, prefixes, state):
+            yield item
+        del events[:]
+
+    parser.close()
+    for item in _select_items(events, prefixes, state):
+        yield item
+
+
+def _select_items(events, prefixes, state):
+    for prefix, event, value in events:
+        builder = state["builder"]
+        if builder is not None:
+            builder.event(event, value)
+            # The selected container ends with the end event at its own prefix
+            if prefix == state["prefix"] and event in ("end_map", "end_array"):
+                yield prefix, builder.value
+                state["builder"] = None
+        elif prefix in prefixes:
+            if event in ("start_map", "start_array"):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                state["builder"] = builder
+                state["prefix"] = prefix
+            elif event not in ("map_key", "end_map", "end_array"):
+                yield prefix, value
@@ -0,0 +1,93 @@
+import os
+import time
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Optional
+from langchain.schema import Document
+from dotenv import load_dotenv
+from crawlers.chroma_utils import save_to_chroma
+from telemetry import timed
+
+# Load environment variables
+load_dotenv()
+
+# Documents per embedding/upsert batch, and how many batches may wait for the save stage
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+IMPORT_QUEUE_SIZE = int(os.getenv("IMPORT_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+# Busy time and items per stage, summed over every import in this process (see get_pipeline_stats)
+_stats_lock = threading.Lock()
+_stats = {"fetch_seconds": 0.0, "pages": 0, "docs_fetched": 0, "save_seconds": 0.0, "docs_saved": 0}
+
+
+def _add_stats(**values):
+    with _stats_lock:
+        for key, value in values.items():
+            _stats[key] += value
+
+
+def get_pipeline_stats(reset=False):
+    with _stats_lock:
+        stats = dict(_stats)
+        if reset:
+            for key in _stats:
+                _stats[key] = type(_stats[key])()
+    return stats
+
+
+async def run_import_pipeline(pages: AsyncIterator[list[dict]], CHROMA_PATH,
+                              progress_callback: Optional[Callable[[str], None]] = None, embedding_model: Optional[str] = None,
+                              batch_size: int = IMPORT_BATCH_SIZE, queue_size: int = IMPORT_QUEUE_SIZE) -> int:
+    # fetch -> embed + upsert, the next pages downloading while earlier batches are saved. The queue
+    # is bounded so a slow embedding stage throttles fetching instead of piling up batches.
+    # pages yields the records of one API page, [{"metadata": {...}, "text": ...}]; the crawlers
+    # extract them while the page streams in, so there is no separate parse step.
+    # Returns how many new documents were saved.
+    batch_queue = asyncio.Queue(maxsize=queue_size)
+    num_saved = 0
+
+    async def fetch_stage():
+        # Time spent waiting for the next page (the API and extraction), not on a full queue
+        pages_iter = aiter(pages)
+        batch = []
+        while True:
+            started = time.perf_counter()
+            try:
+                records = await anext(pages_iter)
+            except StopAsyncIteration:
+                break
+            _add_stats(fetch_seconds=time.perf_counter() - started, pages=1, docs_fetched=len(records))
+            for record in records:
+                batch.append(Document(page_content=record["text"], metadata=record.get("metadata", {})))
+                if len(batch) >= batch_size:
+                    await batch_queue.put(batch)
+                    batch = []
+        if batch:
+            await batch_queue.put(batch)
+        await batch_queue.put(_DONE)
+
+    async def save_stage():
+        nonlocal num_saved
+        while (batch := await batch_queue.get()) is not _DONE:
+            # Embedding and Chroma writes are blocking, keep them off the event loop
+            started = time.perf_counter()
+            with timed("import.save", {"import.docs": len(batch)}) as span:
+                saved = await asyncio.to_thread(save_to_chroma, CHROMA_PATH, batch, embedding_model)
+                span.set_attribute("import.docs_saved", saved)
+            _add_stats(save_seconds=time.perf_counter() - started, docs_saved=saved)
+            num_saved += saved
+            if progress_callback:
+                progress_callback(f"Saved {num_saved} new chunks...")
+
+    tasks = [asyncio.create_task(stage()) for stage in (fetch_stage, save_stage)]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        # One failed stage would leave the others blocked on their queues
+        for task in tasks:
+            task.cancel()
+        raise
+
+    return num_saved
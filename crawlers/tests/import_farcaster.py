@@ -148,8 +148,7 @@ docs = [
 # Initialize embeddings
 embedding_function = OpenAIEmbeddings()  # you can use other embeddings like HuggingFaceEmbeddings
 
-print(docs)
-print("\n\n")
+print(f"{len(docs)} documents\n\n")
 
 
 def main():
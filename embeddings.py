@@ -0,0 +1,207 @@
+import os
+import hashlib
+import logging
+import time
+import threading
+import tiktoken
+from concurrent.futures import ThreadPoolExecutor
+from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
+from dotenv import load_dotenv
+from rate_limit import TokenBucket
+from telemetry import embedding_tokens, timed
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Embedding models are "<provider>:<model>". New persona stores use EMBEDDING_MODEL; every store
+# records the model it was built with (see vector_store.py) and is always queried with it.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "openai:text-embedding-ada-002")
+LOCAL_EMBEDDING_MODELS = {"all-MiniLM-L6-v2"}
+
+# Content-addressed cache of document vectors, shared by all imports
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "/tmp/ai_persona/embedding_cache")
+
+# Batching of embedding requests: a batch is closed when either limit is reached
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "8000"))
+EMBED_BATCH_MAX_TEXTS = int(os.getenv("EMBED_BATCH_MAX_TEXTS", "32"))
+# Batches in flight at once, and embedding requests per second for the whole process
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_REQUESTS_PER_SECOND = float(os.getenv("EMBED_REQUESTS_PER_SECOND", "10"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "3"))
+
+_lock = threading.Lock()
+_embedding_functions = {}  # embedding model -> EmbeddingService
+_document_embedding_functions = {}  # embedding model -> CacheBackedEmbeddings
+
+
+class LocalEmbeddings(Embeddings):
+    # CPU embeddings with the ONNX all-MiniLM-L6-v2 model bundled with chromadb. No network round
+    # trip per query; the model is downloaded once into the chroma cache and loaded once per process.
+
+    def __init__(self, model):
+        from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+        if model not in LOCAL_EMBEDDING_MODELS:
+            raise ValueError(f"Unknown local embedding model: {model}")
+        self.model = model
+        self._embed = ONNXMiniLM_L6_V2(preferred_providers=["CPUExecutionProvider"])
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [[float(value) for value in vector] for vector in self._embed(texts)]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+# provider -> factory(model) -> Embeddings. Local providers (no network) are not rate limited.
+EMBEDDING_PROVIDERS = {
+    "openai": lambda model: OpenAIEmbeddings(model=model, openai_api_base=os.getenv("OPENAI_BASE_URL")),
+    "local": LocalEmbeddings,
+}
+LOCAL_EMBEDDING_PROVIDERS = {"local"}
+
+
+def create_embeddings(embedding_model):
+    provider, _, model = embedding_model.partition(":")
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider: {embedding_model}")
+    return EMBEDDING_PROVIDERS[provider](model)
+
+
+class EmbeddingService(Embeddings):
+    # Embeddings used everywhere in the app. Documents are grouped into token-budgeted batches that
+    # are sent concurrently under a process-wide rate limit (remote providers only); a failed batch is
+    # retried text by text so one bad input does not fail a whole import. Throughput is kept in `stats`.
+
+    def __init__(self, underlying: Embeddings, rate_limited=True):
+        self.underlying = underlying
+        self.model = underlying.model
+        self.bucket = TokenBucket(EMBED_REQUESTS_PER_SECOND, capacity=max(1, EMBED_CONCURRENCY)) if rate_limited else None
+        self.executor = ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY, thread_name_prefix="embed")
+        try:
+            self.encoding = tiktoken.encoding_for_model(self.model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.stats = {"texts": 0, "tokens": 0, "batches": 0, "retried_texts": 0, "seconds": 0.0}
+        self._stats_lock = threading.Lock()
+
+    def make_batches(self, texts: list[str]):
+        # Indexes of texts, grouped so each batch stays under the token and size limits.
+        # Returns (batches, total tokens).
+        batches = []
+        batch, batch_tokens, total_tokens = [], 0, 0
+        for index, text in enumerate(texts):
+            tokens = len(self.encoding.encode(text, disallowed_special=()))
+            if batch and (batch_tokens + tokens > EMBED_BATCH_TOKENS or len(batch) >= EMBED_BATCH_MAX_TEXTS):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(index)
+            batch_tokens += tokens
+            total_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches, total_tokens
+
+    def _wait_for_rate_limit(self):
+        if self.bucket:
+            self.bucket.acquire_blocking()
+
+    def _embed_batch(self, batch_texts: list[str]) -> list[list[float]]:
+        self._wait_for_rate_limit()
+        try:
+            with timed("embedding_batch", {"embedding.model": self.model, "embedding.texts": len(batch_texts)}):
+                return self.underlying.embed_documents(batch_texts)
+        except Exception as e:
+            if len(batch_texts) == 1:
+                raise
+            logger.warning("Embedding batch of %s failed (%s), retrying texts one by one", len(batch_texts), e)
+
+        vectors = []
+        for text in batch_texts:
+            for attempt in range(EMBED_MAX_RETRIES):
+                self._wait_for_rate_limit()
+                try:
+                    vectors.extend(self.underlying.embed_documents([text]))
+                    break
+                except Exception:
+                    if attempt == EMBED_MAX_RETRIES - 1:
+                        raise
+                    time.sleep(2 ** attempt)
+        self._add_stats(retried_texts=len(batch_texts))
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        batches, tokens = self.make_batches(texts)
+        results = self.executor.map(self._embed_batch, [[texts[i] for i in batch] for batch in batches])
+
+        vectors = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for index, vector in zip(batch, batch_vectors):
+                vectors[index] = vector
+
+        elapsed = time.perf_counter() - start
+        self._add_stats(texts=len(texts), tokens=tokens, batches=len(batches), seconds=elapsed)
+        embedding_tokens.add(tokens, {"embedding.model": self.model})
+        logger.info("Embedded %s texts (%s tokens) in %s batches, %.2fs, %.1f texts/s, %.0f tokens/s",
+                    len(texts), tokens, len(batches), elapsed, len(texts) / elapsed, tokens / elapsed)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        self._wait_for_rate_limit()
+        with timed("embedding_query", {"embedding.model": self.model}):
+            return self.underlying.embed_query(text)
+
+    def _add_stats(self, **values):
+        with self._stats_lock:
+            for key, value in values.items():
+                self.stats[key] += value
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["texts_per_second"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["tokens_per_second"] = stats["tokens"] / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+
+def get_embedding_function(embedding_model=None):
+    # One embedding service per model and process, shared by chat retrieval and both crawlers
+    embedding_model = embedding_model or EMBEDDING_MODEL
+    with _lock:
+        if embedding_model not in _embedding_functions:
+            is_local = embedding_model.partition(":")[0] in LOCAL_EMBEDDING_PROVIDERS
+            _embedding_functions[embedding_model] = EmbeddingService(create_embeddings(embedding_model), rate_limited=not is_local)
+        return _embedding_functions[embedding_model]
+
+
+def _cache_namespace(embedding_model, model):
+    # Vectors are cached per model and endpoint: an OpenAI-compatible server at OPENAI_BASE_URL
+    # (e.g. the mock server) may return different vectors under the same model name. The URL is
+    # hashed, cache keys only allow [a-zA-Z0-9_.-/].
+    base_url = os.getenv("OPENAI_BASE_URL") if embedding_model.partition(":")[0] == "openai" else None
+    if not base_url:
+        return model
+    return f"{model}-{hashlib.sha1(base_url.rstrip('/').encode()).hexdigest()[:12]}"
+
+
+def get_document_embedding_function(embedding_model=None):
+    # Embeddings for imported tweets/casts: vectors are looked up by hash(text) under the
+    # model name (and endpoint) first, so re-importing a persona only pays for text we have never seen.
+    embedding_model = embedding_model or EMBEDDING_MODEL
+    embedding_function = get_embedding_function(embedding_model)
+    with _lock:
+        if embedding_model not in _document_embedding_functions:
+            store = LocalFileStore(EMBEDDING_CACHE_PATH)
+            _document_embedding_functions[embedding_model] = CacheBackedEmbeddings.from_bytes_store(
+                embedding_function, store, namespace=_cache_namespace(embedding_model, embedding_function.model)
+            )
+        return _document_embedding_functions[embedding_model]
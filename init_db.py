@@ -1,4 +1,4 @@
-from models import User, get_pgsql_db
+from models import User, get_pgsql_db, invalidate_users
 from sqlalchemy.orm import Session
 
 def init_db():
@@ -51,6 +51,7 @@ def init_db():
             db.add(user)
         
         db.commit()
+        invalidate_users()
         print("Database initialized with initial user data.")
     else:
         print("Database already contains user data.")
@@ -0,0 +1,182 @@
+import os
+import time
+import logging
+import threading
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from dotenv import load_dotenv
+from models import (ImportJob, SessionLocal, insert_new_user_to_pgsql_db,
+                    JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, JOB_STATUS_DONE, JOB_STATUS_FAILED)
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How many imports may run at the same time in this process
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# Jobs of this process are written back (progress and updated_at) every IMPORT_JOB_HEARTBEAT_SECONDS.
+# A queued/running job without a heartbeat for IMPORT_JOB_STALE_SECONDS belonged to a process that
+# is gone (crash, redeploy, Streamlit restart) and is marked failed by the heartbeat, so its handle can
+# be imported again.
+IMPORT_JOB_HEARTBEAT_SECONDS = float(os.getenv("IMPORT_JOB_HEARTBEAT_SECONDS", "3"))
+IMPORT_JOB_STALE_SECONDS = float(os.getenv("IMPORT_JOB_STALE_SECONDS", "120"))
+
+# Every rerun of every session shows the recent jobs, so they are cached per process for
+# IMPORT_JOBS_CACHE_TTL seconds (progress only changes with the heartbeat anyway). Submitting or
+# finishing a job in this process reloads them right away.
+IMPORT_JOBS_CACHE_TTL = float(os.getenv("IMPORT_JOBS_CACHE_TTL", "3"))
+
+ACTIVE_JOB_STATUSES = (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+
+# Module level, so it survives Streamlit reruns and browser refreshes
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="import-job")
+
+# Jobs owned by this process -> column updates not written yet. Progress callbacks run on the
+# import's event loop and only record values here; the heartbeat thread does the writing.
+_owned_jobs = {}
+_owned_jobs_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one writer at a time, so a late heartbeat cannot undo a final status
+_heartbeat_started = False
+
+_recent_jobs = None  # (limit, jobs)
+_recent_jobs_loaded_at = 0.0
+_recent_jobs_lock = threading.Lock()
+
+
+def _start_heartbeat():
+    global _heartbeat_started
+    with _owned_jobs_lock:
+        if _heartbeat_started:
+            return
+        _heartbeat_started = True
+    threading.Thread(target=_heartbeat_loop, name="import-job-heartbeat", daemon=True).start()
+
+
+def _heartbeat_loop():
+    # Also the one place that cleans up after dead processes, so reading the jobs list never writes
+    while True:
+        time.sleep(IMPORT_JOB_HEARTBEAT_SECONDS)
+        try:
+            _flush_jobs()
+            with SessionLocal() as db:
+                _fail_stale_jobs(db)
+        except Exception:
+            logger.exception("Import job heartbeat failed")
+
+
+def _update_job(job_id, **values):
+    with _owned_jobs_lock:
+        if job_id in _owned_jobs:
+            _owned_jobs[job_id].update(values)
+
+
+def _flush_jobs(finished_job_id=None, **final_values):
+    # Write pending updates and a heartbeat for every owned job. With finished_job_id, that job
+    # also gets final_values and stops being owned.
+    with _flush_lock:
+        with _owned_jobs_lock:
+            updates = {job_id: dict(values) for job_id, values in _owned_jobs.items()}
+            for values in _owned_jobs.values():
+                values.clear()
+            if finished_job_id is not None:
+                _owned_jobs.pop(finished_job_id, None)
+                updates[finished_job_id] = {**updates.get(finished_job_id, {}), **final_values}
+        if not updates:
+            return
+        with SessionLocal() as db:
+            for job_id, values in updates.items():
+                db.query(ImportJob).filter(ImportJob.id == job_id).update(
+                    {**values, "updated_at": func.now()}, synchronize_session=False
+                )
+            db.commit()
+    if finished_job_id is not None:
+        _invalidate_recent_jobs()
+
+
+def _invalidate_recent_jobs():
+    global _recent_jobs
+    with _recent_jobs_lock:
+        _recent_jobs = None
+
+
+def _fail_stale_jobs(db):
+    with _owned_jobs_lock:
+        owned_job_ids = list(_owned_jobs)
+    stale = db.query(ImportJob).filter(
+        ImportJob.status.in_(ACTIVE_JOB_STATUSES),
+        ImportJob.updated_at < func.now() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS),
+        ImportJob.id.notin_(owned_job_ids)
+    ).update({"status": JOB_STATUS_FAILED, "status_message": "Import interrupted, please try again"},
+             synchronize_session=False)
+    db.commit()
+    if stale:
+        logger.warning("Marked %s interrupted import jobs as failed", stale)
+        _invalidate_recent_jobs()
+
+
+def submit_import_job(twitter_handle) -> int:
+    # Queue an import of the handle and return the job id. If the handle is already being
+    # imported, the running job is returned instead of starting a second one.
+    _start_heartbeat()
+    with SessionLocal() as db:
+        _fail_stale_jobs(db)
+        active_job = db.query(ImportJob).filter(
+            ImportJob.twitter_handle == twitter_handle,
+            ImportJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).first()
+        if active_job:
+            return active_job.id
+
+        job = ImportJob(twitter_handle=twitter_handle, status=JOB_STATUS_QUEUED, status_message="Queued")
+        db.add(job)
+        db.commit()
+        job_id = job.id
+
+    # Owned from here on, so the heartbeat keeps it alive while it waits for a worker
+    with _owned_jobs_lock:
+        _owned_jobs[job_id] = {}
+    _executor.submit(_run_import_job, job_id, twitter_handle)
+    _invalidate_recent_jobs()
+    return job_id
+
+
+def get_recent_import_jobs(limit=5):
+    # The returned jobs are detached from their session, treat them as read only.
+    # Only reads; the heartbeat started here fails jobs left behind by dead processes.
+    global _recent_jobs, _recent_jobs_loaded_at
+    _start_heartbeat()
+    with _recent_jobs_lock:
+        if _recent_jobs is None or _recent_jobs[0] != limit or time.time() - _recent_jobs_loaded_at > IMPORT_JOBS_CACHE_TTL:
+            with SessionLocal() as db:
+                jobs = db.query(ImportJob).order_by(ImportJob.id.desc()).limit(limit).all()
+            _recent_jobs = (limit, jobs)
+            _recent_jobs_loaded_at = time.time()
+        return _recent_jobs[1]
+
+
+def _run_import_job(job_id, twitter_handle):
+    try:
+        _update_job(job_id, status=JOB_STATUS_RUNNING)
+        _flush_jobs()
+
+        # Progress is persisted on the job row by the heartbeat, the UI reads it back when it reruns
+        def update_tw_progress(progress, status):
+            _update_job(job_id, twitter_progress=progress, status_message=status)
+
+        def update_fc_progress(progress, status):
+            _update_job(job_id, farcaster_progress=progress, status_message=status)
+
+        result = insert_new_user_to_pgsql_db(twitter_handle, update_tw_progress, update_fc_progress)
+
+        if result.startswith("User successfully added"):
+            _flush_jobs(job_id, status=JOB_STATUS_DONE, twitter_progress=100, farcaster_progress=100,
+                        status_message=result)
+        else:
+            _flush_jobs(job_id, status=JOB_STATUS_FAILED, status_message=result)
+
+    except Exception as e:
+        logger.exception("Import job %s for @%s failed", job_id, twitter_handle)
+        _flush_jobs(job_id, status=JOB_STATUS_FAILED, status_message=f"Import failed: {e}")
@@ -0,0 +1,147 @@
+import os
+import logging
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+# Per-persona BM25 index, an SQLite FTS5 table next to the Chroma files, or in SHARED_CHROMA_PATH
+# named after the persona's collection with VECTOR_STORE_MODE=shared. SQLite only reads the pages a
+# query touches, so nothing is loaded up front and an index is never held in memory.
+LEXICAL_INDEX_FILE = "lexical_index.sqlite3"
+LEXICAL_INDEX_DIR = "lexical"  # Under SHARED_CHROMA_PATH
+
+# $tickers, #hashtags and @handles stay one token; ENS names like vitalik.eth become a phrase
+_TOKENIZER = "unicode61 remove_diacritics 2 tokenchars '$#@_'"
+_TERM = re.compile(r"[$#@]?\w+(?:\.\w+)*")
+STOP_WORDS = frozenset(
+    "a an and are as at be but by can do does did for from had has have how i if in is it its me my "
+    "of on or so that the their them they this to was we were what when where which who why will "
+    "with would you your about think".split()
+)
+
+# One lock per persona path for everything that writes its store and index: imports (crawlers/chroma_utils.py)
+# and the lazy index build on first search. Reentrant, an import may build the index it then writes to.
+_path_locks = defaultdict(threading.RLock)
+_path_locks_lock = threading.Lock()
+
+
+def get_path_lock(chroma_path):
+    with _path_locks_lock:
+        return _path_locks[chroma_path]
+
+
+def _index_path(chroma_path):
+    # Imported here, vector_store imports this module (through pgvector_store)
+    from vector_store import VECTOR_STORE_MODE, SHARED_CHROMA_PATH, get_shared_collection_name
+    if VECTOR_STORE_MODE == "shared":
+        # The persona has no directory of its own in this mode
+        return os.path.join(SHARED_CHROMA_PATH, LEXICAL_INDEX_DIR, get_shared_collection_name(chroma_path) + ".sqlite3")
+    return os.path.join(chroma_path, LEXICAL_INDEX_FILE)
+
+
+def _connect(chroma_path, create=False):
+    # Searches only read; the index file and table are created by the first write
+    index_path = _index_path(chroma_path)
+    if create:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    connection = sqlite3.connect(index_path)
+    if create:
+        connection.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS posts USING fts5(doc_id UNINDEXED, source UNINDEXED, "
+            f"type UNINDEXED, text, tokenize = \"{_TOKENIZER}\")"
+        )
+    return connection
+
+
+def has_lexical_index(chroma_path):
+    return os.path.exists(_index_path(chroma_path))
+
+
+def index_documents(chroma_path, ids: list[str], docs: list[Document]):
+    # Add or replace posts by id. Called right after the same posts were upserted into Chroma,
+    # under get_path_lock(chroma_path).
+    connection = _connect(chroma_path, create=True)
+    try:
+        with connection:
+            connection.executemany("DELETE FROM posts WHERE doc_id = ?", [(doc_id,) for doc_id in ids])
+            connection.executemany(
+                "INSERT INTO posts (doc_id, source, type, text) VALUES (?, ?, ?, ?)",
+                [
+                    (doc_id, doc.metadata.get("source"), doc.metadata.get("type"), doc.page_content)
+                    for doc_id, doc in zip(ids, docs)
+                ]
+            )
+    finally:
+        connection.close()
+
+
+def build_lexical_index(chroma_path, vector_db):
+    # One-off backfill for stores imported before the lexical index existed
+    with get_path_lock(chroma_path):
+        if has_lexical_index(chroma_path):
+            return
+        stored = vector_db.get(include=["documents", "metadatas"])
+        docs = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(stored["documents"], stored["metadatas"])
+        ]
+        logger.info("Building lexical index for %s (%s posts)", chroma_path, len(docs))
+        index_documents(chroma_path, stored["ids"], docs)
+
+
+def query_terms(question):
+    # The question's search terms, without stop words. A $ticker or #hashtag also matches posts
+    # that use the bare word.
+    terms = []
+    for term in _TERM.findall(question.lower()):
+        for variant in (term, term.lstrip("$#@")):
+            if variant and variant not in STOP_WORDS and variant not in terms:
+                terms.append(variant)
+    return terms
+
+
+def count_matched_terms(question, text):
+    # (question words found in the text, question words), stop words left out. A $ticker or #hashtag
+    # in either one matches the bare word.
+    words = set()
+    for term in _TERM.findall(text.lower()):
+        words.update((term, term.lstrip("$#@")))
+    question_words = {}
+    for term in _TERM.findall(question.lower()):
+        bare = term.lstrip("$#@")
+        if bare and bare not in STOP_WORDS:
+            question_words[bare] = question_words.get(bare, False) or term in words or bare in words
+    return sum(question_words.values()), len(question_words)
+
+
+def _match_query(question):
+    # OR of the question's terms, each quoted so FTS5 operators in user input are taken literally
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in query_terms(question))
+
+
+def search_lexical_index(chroma_path, question, k):
+    # [(Document, bm25 score)], best first. FTS5's bm25() is negative, so it is flipped here.
+    match_query = _match_query(question)
+    if not match_query or not has_lexical_index(chroma_path):
+        return []
+
+    connection = _connect(chroma_path)
+    try:
+        rows = connection.execute(
+            "SELECT source, type, text, bm25(posts) AS rank FROM posts WHERE posts MATCH ? ORDER BY rank LIMIT ?",
+            (match_query, k)
+        ).fetchall()
+    finally:
+        connection.close()
+
+    results = []
+    for source, doc_type, text, rank in rows:
+        metadata = {"source": source}
+        if doc_type:
+            metadata["type"] = doc_type
+        results.append((Document(page_content=text, metadata=metadata), -rank))
+    return results
@@ -0,0 +1,90 @@
+import os
+import argparse
+import chromadb
+from models import User, get_pgsql_db
+from sqlalchemy import text
+from pgvector_store import (PGVECTOR_INDEX, STORES_TABLE, PgVectorStore, build_ivfflat_index, get_engine,
+                            get_store_embedding_model)
+from telemetry import configure_telemetry
+from vector_store import (COLLECTION_NAME, LEGACY_EMBEDDING_MODEL, get_shared_chroma_client,
+                          get_shared_collection_name)
+
+# Copy every persona's Chroma directory into the store used with VECTOR_STORE_MODE=shared (default)
+# or VECTOR_STORE_MODE=pgvector. Vectors are copied as they are, nothing is re-embedded, and running
+# it again only updates what was already copied. The directories are left in place; remove them
+# once the app runs in the new mode.
+# With PGVECTOR_INDEX=ivfflat the index is built once the vectors are in; --reindex rebuilds it
+# alone, e.g. after imports have grown the tables a lot.
+#   python migrate_vector_stores.py [--target shared|pgvector] [--batch-size 1000] [--dry-run] [--reindex]
+
+
+def open_target(chroma_path, embedding_model, target):
+    # Returns upsert(ids, embeddings, documents, metadatas) for the persona in the target store
+    if target == "pgvector":
+        store_embedding_model, dimension = get_store_embedding_model(chroma_path, embedding_model)
+        store = PgVectorStore(chroma_path, None, store_embedding_model, dimension)
+        return lambda ids, embeddings, documents, metadatas: store.add_embeddings(ids, documents, embeddings, metadatas)
+
+    collection = get_shared_chroma_client().get_or_create_collection(
+        get_shared_collection_name(chroma_path), metadata={"embedding_model": embedding_model}
+    )
+    return lambda ids, embeddings, documents, metadatas: collection.upsert(
+        ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas
+    )
+
+
+def migrate_persona(chroma_path, target, batch_size, dry_run=False):
+    source = chromadb.PersistentClient(path=chroma_path).get_collection(COLLECTION_NAME)
+    embedding_model = (source.metadata or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL)
+    total = source.count()
+    print(f"{chroma_path}: {total} posts ({embedding_model}) -> {target}")
+    if dry_run:
+        return total
+
+    upsert = open_target(chroma_path, embedding_model, target)
+    for offset in range(0, total, batch_size):
+        batch = source.get(limit=batch_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        upsert(batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+        print(f"  copied {min(offset + batch_size, total)}/{total}")
+    return total
+
+
+def reindex_ivfflat():
+    with get_engine().connect() as conn:
+        dimensions = conn.execute(text(f"SELECT DISTINCT dimension FROM {STORES_TABLE} WHERE dimension IS NOT NULL")).scalars().all()
+    for dimension in dimensions:
+        rows, lists = build_ivfflat_index(dimension)
+        print(f"IVFFlat index for {dimension} dimensions: {rows} vectors in {lists} lists")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=["shared", "pgvector"], default="shared")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be copied")
+    parser.add_argument("--reindex", action="store_true", help="Only rebuild the pgvector IVFFlat indexes")
+    args = parser.parse_args()
+    configure_telemetry()
+
+    if args.reindex:
+        reindex_ivfflat()
+        return
+
+    db = next(get_pgsql_db())
+    migrated = 0
+    for user in db.query(User).order_by(User.id).all():
+        if not os.path.isdir(user.chroma_path):
+            print(f"{user.name}: no store at {user.chroma_path}, skipped")
+            continue
+        try:
+            migrated += migrate_persona(user.chroma_path, args.target, args.batch_size, args.dry_run)
+        except Exception as e:
+            print(f"{user.name}: migration failed: {e}")
+
+    print(f"{'Would copy' if args.dry_run else 'Copied'} {migrated} posts into the {args.target} store")
+    if args.target == "pgvector" and PGVECTOR_INDEX == "ivfflat" and not args.dry_run:
+        reindex_ivfflat()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import uvicorn
+from mock_servers.payloads import load_pages
+from mock_servers.faults import Faults
+from mock_servers.server import create_app, TWITTER_PREFIX, FIREFLY_PREFIX, OPENAI_PREFIX
+
+# Local stand-ins for RapidAPI Twitter, Firefly and OpenAI, for load tests without network access:
+#   python -m mock_servers [--port 8100] [--latency 0.2] [--twitter-rate 10] [--failure-rate 0.01]
+# then run the app or the crawlers with the base URLs printed at startup.
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--pages", help="Directory of recorded /user-tweets responses (*.json), served to every user")
+    parser.add_argument("--casts", help="Directory of recorded Farcaster timeline responses (*.json), served to every fid")
+    parser.add_argument("--num-pages", type=int, default=50, help="Synthetic timeline pages per user")
+    parser.add_argument("--cast-pages", type=int, default=20, help="Synthetic Farcaster pages per fid")
+    parser.add_argument("--latency", type=float, default=0.2, help="Twitter and Firefly round trip, seconds")
+    parser.add_argument("--jitter", type=float, default=0.05, help="Random +/- added to every latency, seconds")
+    parser.add_argument("--twitter-rate", type=float, default=0, help="Requests/s before 429s, 0 for no limit")
+    parser.add_argument("--firefly-rate", type=float, default=0, help="Requests/s before 429s, 0 for no limit")
+    parser.add_argument("--openai-rate", type=float, default=0, help="Requests/s before 429s, 0 for no limit")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests answered with a 5xx")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="OpenAI round trip, seconds")
+    parser.add_argument("--dimension", type=int, default=1536, help="Embedding dimension")
+    parser.add_argument("--first-token", type=float, default=0.3, help="Chat time to first token, seconds")
+    parser.add_argument("--token", type=float, default=0.01, help="Chat time per token, seconds")
+    args = parser.parse_args()
+
+    app = create_app(
+        twitter_faults=Faults(args.latency, args.jitter, args.twitter_rate, args.failure_rate, seed=1),
+        firefly_faults=Faults(args.latency, args.jitter, args.firefly_rate, args.failure_rate, seed=2),
+        # Chat completions take --first-token and --token on top of the round trip
+        openai_faults=Faults(args.openai_latency, 0, args.openai_rate, args.failure_rate, seed=3),
+        timeline_pages=load_pages(args.pages) if args.pages else None,
+        cast_pages=load_pages(args.casts) if args.casts else None,
+        num_pages=args.num_pages,
+        num_cast_pages=args.cast_pages,
+        dimension=args.dimension,
+        first_token_latency=args.first_token,
+        token_latency=args.token,
+    )
+
+    base_url = f"http://{args.host}:{args.port}"
+    print(f"TWITTER_API_BASE_URL={base_url}{TWITTER_PREFIX}")
+    print(f"FIREFLY_API_BASE_URL={base_url}{FIREFLY_PREFIX}")
+    print(f"OPENAI_BASE_URL={base_url}{OPENAI_PREFIX}")
+    print(f"Request counts: {base_url}/stats")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
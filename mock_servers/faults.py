@@ -0,0 +1,36 @@
+import random
+import asyncio
+from fastapi.responses import JSONResponse
+from rate_limit import TokenBucket
+
+# What makes a stand-in behave like the real API under load: a round trip, a rate limit answered with
+# 429 + Retry-After, and the occasional 5xx. Each stand-in has its own instance.
+
+
+class Faults:
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0.0, failure_rate=0.0, seed=0):
+        # rate_limit: requests per second before 429s (0 for none); failure_rate: share of 5xx responses
+        self.latency = latency
+        self.jitter = jitter
+        self.bucket = TokenBucket(rate_limit, capacity=max(1, int(rate_limit))) if rate_limit else None
+        self.retry_after = max(1, round(1 / rate_limit)) if rate_limit else None
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "failed": 0}
+
+    async def __call__(self, request, call_next):
+        # As FastAPI http middleware
+        self.stats["requests"] += 1
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.bucket and not self.bucket.try_acquire():
+            self.stats["rate_limited"] += 1
+            return JSONResponse({"message": "Too many requests"}, status_code=429,
+                                headers={"retry-after": str(self.retry_after)})
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.stats["failed"] += 1
+            return JSONResponse({"message": "Upstream error"}, status_code=self.rng.choice([500, 502, 503]))
+        return await call_next(request)
@@ -0,0 +1,36 @@
+import zlib
+from functools import lru_cache
+from fastapi import FastAPI, Request
+from mock_servers.payloads import make_cast_pages
+
+# Stand-in for the Firefly endpoints the app uses: /v2/wallet/profileinfo (Twitter id -> Farcaster
+# fid) and /v2/user/timeline/farcaster (cast pages, POSTed with the cursor of the previous one).
+
+
+def create_firefly_app(faults, pages=None, num_pages=20):
+    # pages: recorded timeline responses served for every fid; otherwise synthetic pages per fid
+    app = FastAPI()
+    app.middleware("http")(faults)
+
+    @lru_cache(maxsize=64)
+    def timeline(fid):
+        fid_pages = pages if pages is not None else make_cast_pages(num_pages, seed=zlib.crc32(fid.encode()))
+        cursors = {page["data"].get("cursor"): i + 1 for i, page in enumerate(fid_pages)}
+        return fid_pages, cursors
+
+    @app.get("/v2/wallet/profileinfo")
+    async def profile_info(twitterId: str):
+        # Every Twitter user has a Farcaster account here
+        return {"data": {"farcasterProfiles": [{"fid": zlib.crc32(twitterId.encode()) % 10 ** 6 + 1}]}}
+
+    @app.post("/v2/user/timeline/farcaster")
+    async def farcaster_timeline(request: Request):
+        body = await request.json()
+        cursor = body.get("cursor")
+        fid_pages, cursors = timeline(str((body.get("fids") or ["0"])[0]))
+        index = cursors.get(cursor, len(fid_pages)) if cursor else 0
+        if index < len(fid_pages):
+            return fid_pages[index]
+        return {"code": 0, "data": {"casts": [], "cursor": None}}
+
+    return app
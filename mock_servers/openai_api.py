@@ -0,0 +1,93 @@
+import re
+import json
+import time
+import base64
+import asyncio
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from mock_servers.payloads import hash_embedding
+
+# Stand-in for the OpenAI endpoints the app uses, mounted so OPENAI_BASE_URL ends in /v1:
+# /embeddings (hashed bag-of-words vectors, so similar texts still get similar vectors) and
+# /chat/completions (a fixed reply, streamed token by token with a set time to first token).
+
+DEFAULT_REPLY = "gm! Building onchain is the way, and the community is what makes it worth it. " * 3
+
+
+def _count_tokens(text):
+    # Close enough to tiktoken for usage numbers
+    return max(1, len(text) // 4)
+
+
+def _tokens(text):
+    return re.findall(r"\S+\s*", text)
+
+
+def create_openai_app(faults, dimension=1536, reply=DEFAULT_REPLY, first_token_latency=0.3, token_latency=0.01):
+    app = FastAPI()
+    app.middleware("http")(faults)
+
+    @app.post("/embeddings")
+    async def create_embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        # langchain sends tiktoken token ids rather than text, hash those like words
+        if inputs and isinstance(inputs[0], int):
+            inputs = [inputs]
+        texts = [" ".join(map(str, item)) if isinstance(item, list) else item for item in inputs]
+        tokens = sum(len(item) if isinstance(item, list) else _count_tokens(item) for item in inputs)
+
+        data = []
+        for index, vector in enumerate(hash_embedding(text, dimension) for text in texts):
+            if body.get("encoding_format") == "base64":
+                # What the openai client asks for when numpy is installed
+                vector = base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode()
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        return {"object": "list", "data": data, "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.post("/chat/completions")
+    async def create_chat_completion(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_tokens = sum(_count_tokens(str(message.get("content") or "")) for message in messages)
+        system = " ".join(str(message.get("content") or "") for message in messages if message.get("role") == "system")
+        content = "Would you like to know more about how this gets built?" if "follow-up questions" in system else reply
+        tokens = _tokens(content)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens), "prompt_tokens_details": {"cached_tokens": 0}}
+        completion_id = f"chatcmpl-mock-{time.time_ns()}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4.1")
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token_latency + token_latency * len(tokens))
+            return {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}],
+            }) + "\n\n"
+
+        async def events():
+            await asyncio.sleep(first_token_latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                yield chunk({"content": token})
+                await asyncio.sleep(token_latency)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                                             "model": model, "choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import glob
+import random
+import hashlib
+import numpy as np
+
+# API payloads served by the stand-ins: recorded responses (raw API responses saved as *.json) or
+# synthetic ones with the same shape as twitter241 /user-tweets and Firefly's cast timeline, and
+# hashed embedding vectors. The benchmarks build their inputs from these as well.
+
+
+def load_pages(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path) as f:
+            pages.append(json.load(f))
+    return pages
+
+
+def random_words(rng, n):
+    vocab = ["gm", "ethereum", "$ETH", "#web3", "vitalik.eth", "rollups", "zk", "build", "ship", "the",
+             "community", "wallet", "onchain", "L2", "airdrop", "NFT", "defi", "farcaster", "frames", "today"]
+    return " ".join(rng.choice(vocab) for _ in range(n))
+
+
+def _user(rng, user_id):
+    return {
+        "__typename": "User",
+        "id": f"VXNlcjo{user_id}",
+        "rest_id": str(user_id),
+        "is_blue_verified": True,
+        "legacy": {
+            "created_at": "Sat Mar 13 12:00:00 +0000 2010",
+            "description": random_words(rng, 15),
+            "entities": {"description": {"urls": []}, "url": {"urls": [{"expanded_url": "https://example.com"}]}},
+            "followers_count": rng.randint(0, 10 ** 6),
+            "friends_count": rng.randint(0, 5000),
+            "name": f"user {user_id}",
+            "screen_name": f"user{user_id}",
+            "pinned_tweet_ids_str": [str(rng.randint(10 ** 17, 10 ** 18))],
+            "profile_image_url_https": "https://pbs.twimg.com/profile_images/1/x_normal.jpg",
+        },
+        "professional": {"rest_id": str(user_id + 1), "category": [{"id": 1, "name": "Tech"}]},
+    }
+
+
+def _tweet(rng, tweet_id, author_id, depth=0):
+    tweet = {
+        "__typename": "Tweet",
+        "rest_id": str(tweet_id),
+        "core": {"user_results": {"result": _user(rng, author_id)}},
+        "edit_control": {"edit_tweet_ids": [str(tweet_id)], "editable_until_msecs": "1700000000000"},
+        "views": {"count": str(rng.randint(0, 10 ** 6)), "state": "EnabledWithCount"},
+        "source": "<a href=\"https://mobile.twitter.com\">Twitter Web App</a>",
+    }
+    # Long tweets carry the whole text in note_tweet, which comes before legacy in the API response
+    if rng.random() < 0.2:
+        tweet["note_tweet"] = {"note_tweet_results": {"result": {"id": "Tm90ZVR3", "text": random_words(rng, 120)}}}
+    tweet.update({
+        "legacy": {
+            "created_at": "Mon Apr 14 12:00:00 +0000 2025",
+            "conversation_id_str": str(tweet_id),
+            "entities": {"hashtags": [{"text": "web3", "indices": [0, 5]}], "urls": [], "user_mentions": [],
+                         "symbols": [{"text": "ETH", "indices": [6, 10]}]},
+            "favorite_count": rng.randint(0, 10 ** 4),
+            "full_text": random_words(rng, rng.randint(5, 40)),
+            "lang": "en",
+            "retweet_count": rng.randint(0, 1000),
+            "user_id_str": str(author_id),
+            "id_str": str(tweet_id),
+        },
+    })
+    if depth == 0 and rng.random() < 0.15:
+        original = _tweet(rng, tweet_id - rng.randint(10 ** 6, 10 ** 9), author_id + 7, depth=1)
+        tweet["legacy"]["full_text"] = "RT @user: " + original["legacy"]["full_text"]
+        tweet["legacy"]["retweeted_status_result"] = {"result": original}
+    elif depth == 0 and rng.random() < 0.1:
+        tweet["quoted_status_result"] = {"result": _tweet(rng, tweet_id - rng.randint(10 ** 6, 10 ** 9), author_id + 3, depth=1)}
+    return tweet
+
+
+def make_timeline_page(page_index, tweets_per_page=20, seed=0):
+    rng = random.Random(seed * 100003 + page_index)
+    author_id = 25073877
+    newest_id = 1900000000000000000 - page_index * tweets_per_page * 10 ** 9
+
+    entries = []
+    for i in range(tweets_per_page):
+        tweet_id = newest_id - i * 10 ** 9
+        entries.append({
+            "entryId": f"tweet-{tweet_id}",
+            "sortIndex": str(tweet_id),
+            "content": {
+                "entryType": "TimelineTimelineItem",
+                "__typename": "TimelineTimelineItem",
+                "itemContent": {
+                    "itemType": "TimelineTweet",
+                    "__typename": "TimelineTweet",
+                    "tweet_results": {"result": _tweet(rng, tweet_id, author_id)},
+                    "tweetDisplayType": "Tweet",
+                },
+            },
+        })
+
+    # Who-to-follow module: user profiles only, no tweets
+    entries.append({
+        "entryId": f"who-to-follow-{page_index}",
+        "content": {
+            "entryType": "TimelineTimelineModule",
+            "items": [
+                {"entryId": f"who-to-follow-{page_index}-user-{j}",
+                 "item": {"itemContent": {"itemType": "TimelineUser", "user_results": {"result": _user(rng, 1000 + j)}}}}
+                for j in range(3)
+            ],
+        },
+    })
+    bottom_cursor = f"DAABCgABGB{page_index + 1:08d}"
+    entries.append({"entryId": f"cursor-bottom-{page_index}", "content": {"entryType": "TimelineTimelineCursor", "value": bottom_cursor, "cursorType": "Bottom"}})
+
+    instructions = [{"type": "TimelineClearCache"}]
+    if page_index == 0:
+        pinned_id = newest_id - 500 * 10 ** 9
+        instructions.append({"type": "TimelinePinEntry", "entry": {
+            "entryId": f"tweet-{pinned_id}",
+            "content": {"itemContent": {"itemType": "TimelineTweet", "tweet_results": {"result": _tweet(rng, pinned_id, author_id)}}},
+        }})
+    instructions.append({"type": "TimelineAddEntries", "entries": entries})
+
+    return {
+        "cursor": {"bottom": bottom_cursor, "top": f"DAABCgABGA{page_index:08d}"},
+        "result": {"timeline": {"instructions": instructions, "metadata": {"scribeConfig": {"page": "profileBest"}}}},
+    }
+
+
+def make_timeline_pages(num_pages=50, tweets_per_page=20, seed=0):
+    return [make_timeline_page(i, tweets_per_page, seed) for i in range(num_pages)]
+
+
+def make_cast_page(page_index, casts_per_page=20, seed=0, last_page=False):
+    # Same shape as Firefly's /v2/user/timeline/farcaster response
+    rng = random.Random(seed * 100019 + page_index)
+    casts = []
+    for i in range(casts_per_page):
+        casts.append({
+            "hash": f"0x{rng.getrandbits(160):040x}",
+            "fid": "5650",
+            "text": random_words(rng, rng.randint(3, 60)),
+            "timestamp": 1700000000 - (page_index * casts_per_page + i) * 3600,
+            "author": {"fid": "5650", "username": "vitalik.eth", "display_name": "Vitalik Buterin"},
+            "embeds": [{"url": "https://example.com"}] if rng.random() < 0.2 else [],
+            "reactions": {"likes_count": rng.randint(0, 5000), "recasts_count": rng.randint(0, 500)},
+            "replies": {"count": rng.randint(0, 200)},
+        })
+    return {"code": 0, "data": {"casts": casts, "cursor": None if last_page else f"cast-cursor-{page_index + 1}"}}
+
+
+def make_cast_pages(num_pages=20, casts_per_page=20, seed=0):
+    return [make_cast_page(i, casts_per_page, seed, last_page=i == num_pages - 1) for i in range(num_pages)]
+
+
+def hash_embedding(text, dimension):
+    # Bag of hashed words, normalized. Texts sharing words get similar vectors, so relevance
+    # gating and ranking behave roughly as with real embeddings.
+    vector = np.zeros(dimension, dtype=np.float32)
+    for word in re.findall(r"[$#]?\w+", text.lower()):
+        vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dimension] += 1.0
+    norm = np.linalg.norm(vector)
+    return (vector / norm if norm else vector).tolist()
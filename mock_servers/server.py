@@ -0,0 +1,36 @@
+from fastapi import FastAPI
+from mock_servers.faults import Faults
+from mock_servers.twitter import create_twitter_app
+from mock_servers.firefly import create_firefly_app
+from mock_servers.openai_api import create_openai_app
+
+# The three stand-ins behind one server, each under its own prefix and with its own faults, so the
+# app is pointed at them with base URLs alone:
+#   TWITTER_API_BASE_URL=http://localhost:8100/twitter
+#   FIREFLY_API_BASE_URL=http://localhost:8100/firefly
+#   OPENAI_BASE_URL=http://localhost:8100/openai/v1
+TWITTER_PREFIX = "/twitter"
+FIREFLY_PREFIX = "/firefly"
+OPENAI_PREFIX = "/openai/v1"
+
+
+def create_app(twitter_faults=None, firefly_faults=None, openai_faults=None, timeline_pages=None, cast_pages=None,
+               num_pages=50, num_cast_pages=20, **openai_options):
+    # openai_options: dimension, reply, first_token_latency, token_latency (see create_openai_app)
+    faults = {
+        "twitter": twitter_faults or Faults(),
+        "firefly": firefly_faults or Faults(),
+        "openai": openai_faults or Faults(),
+    }
+    app = FastAPI()
+    app.mount(TWITTER_PREFIX, create_twitter_app(faults["twitter"], timeline_pages, num_pages))
+    app.mount(FIREFLY_PREFIX, create_firefly_app(faults["firefly"], cast_pages, num_cast_pages))
+    app.mount(OPENAI_PREFIX, create_openai_app(faults["openai"], **openai_options))
+    app.state.faults = faults
+
+    @app.get("/stats")
+    async def stats():
+        # Requests, 429s and injected failures per stand-in
+        return {name: service_faults.stats for name, service_faults in faults.items()}
+
+    return app
@@ -0,0 +1,48 @@
+import zlib
+from functools import lru_cache
+from fastapi import FastAPI
+from mock_servers.payloads import make_timeline_pages
+
+# Stand-in for the twitter241 RapidAPI endpoints the app uses: /user (handle lookup) and
+# /user-tweets (timeline pages, followed by their bottom cursor).
+
+
+def _user_id(username):
+    # Stable made-up id per handle, below 2**31 since users.twitter_id is an Integer column
+    return str(10 ** 8 + zlib.crc32(username.lower().encode()) % 10 ** 9)
+
+
+def create_twitter_app(faults, pages=None, num_pages=50):
+    # pages: recorded /user-tweets responses served to every user; otherwise synthetic pages,
+    # different for each user so imports of several personas do not share texts
+    app = FastAPI()
+    app.middleware("http")(faults)
+
+    @lru_cache(maxsize=64)
+    def timeline(user):
+        user_pages = pages if pages is not None else make_timeline_pages(num_pages, seed=zlib.crc32(user.encode()))
+        # Cursor handed out with page i -> index of the page that follows it
+        cursors = {page.get("cursor", {}).get("bottom"): i + 1 for i, page in enumerate(user_pages)}
+        return user_pages, cursors
+
+    @app.get("/user")
+    async def user(username: str):
+        return {"result": {"data": {"user": {"result": {
+            "rest_id": _user_id(username),
+            "legacy": {
+                "screen_name": username,
+                "description": f"{username}, a builder in the Ethereum community",
+                "profile_image_url_https": "https://abs.twimg.com/sticky/default_profile_images/default_profile_normal.png",
+            },
+        }}}}}
+
+    @app.get("/user-tweets")
+    async def user_tweets(user: str, count: int = 20, cursor: str = None):
+        user_pages, cursors = timeline(user)
+        index = cursors.get(cursor, len(user_pages)) if cursor else 0
+        if index < len(user_pages):
+            return user_pages[index]
+        # Past the end the API still answers, with an empty timeline
+        return {"result": {"timeline": {"instructions": []}}}
+
+    return app
@@ -1,17 +1,37 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, text, func
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import logging
+import time
+import select
+import asyncio
+import threading
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from typing import Callable
 from dotenv import load_dotenv
 import requests
-from crawlers.import_farcaster import checkUserHasFarcaster, import_farcaster_data
-from crawlers.import_twitter import import_twitter_data
+from crawlers.fetcher import Fetcher, TWITTER_API_BASE_URL
+from crawlers.import_farcaster import checkUserHasFarcasterAsync, import_farcaster_data_async
+from crawlers.import_twitter import import_twitter_data_async
 from sqlalchemy.orm import Session
+from vector_store import evict_vector_db, keep_store_open, open_vector_db
+from style_profile import build_style_profile
+from embeddings import EMBEDDING_MODEL
+
+logger = logging.getLogger(__name__)
 
 # Status constants
 STATUS_NOT_IMPORTED = 0
 STATUS_FULLY_IMPORTED = 9
 
+# Import job status constants
+JOB_STATUS_FAILED = -1
+JOB_STATUS_QUEUED = 0
+JOB_STATUS_RUNNING = 1
+JOB_STATUS_DONE = 9
+
 # Load environment variables
 load_dotenv()
 
@@ -25,8 +45,10 @@ DB_PORT = os.getenv("DB_PORT", "5432")
 # Create database URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create engine
-engine = create_engine(DATABASE_URL)
+# Create engine, one connection pool per process shared by all sessions and import jobs
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+engine = create_engine(DATABASE_URL, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_pre_ping=True)
 
 # Create session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -46,10 +68,35 @@ class User(Base):
     twitter_id = Column(Integer, nullable=False)
     farcaster_id = Column(Integer, nullable=True)
     status = Column(Integer, nullable=False, default=0)
+    last_tweet_id = Column(String(32), nullable=True)  # Newest imported tweet, incremental imports stop there
+    embedding_model = Column(String(100), nullable=True)  # "<provider>:<model>" for a new store, EMBEDDING_MODEL if empty
+    style_profile = Column(Text, nullable=True)  # Writing style distilled at import time, see style_profile.py
+
+class ImportJob(Base):
+    __tablename__ = "ai_persona_import_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    twitter_handle = Column(String(100), nullable=False, index=True)
+    status = Column(Integer, nullable=False, default=JOB_STATUS_QUEUED)
+    twitter_progress = Column(Integer, nullable=False, default=0)
+    farcaster_progress = Column(Integer, nullable=False, default=0)
+    status_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# create_all() does not add columns to an existing table, so add the ones introduced later
+ADDED_COLUMNS = [
+    "last_tweet_id VARCHAR(32)",
+    "embedding_model VARCHAR(100)",
+    "style_profile TEXT",
+]
+with engine.begin() as conn:
+    for column in ADDED_COLUMNS:
+        conn.execute(text(f"ALTER TABLE {User.__tablename__} ADD COLUMN IF NOT EXISTS {column}"))
+
 def get_pgsql_db():
     db = SessionLocal()
     try:
@@ -57,23 +104,85 @@ def get_pgsql_db():
     finally:
         db.close()
 
-def get_users(pgsql_db: Session):
-    print(f"enter get_users()")
-    return pgsql_db.query(User).filter(User.status == STATUS_FULLY_IMPORTED).order_by(User.id).all()
+# The roster of fully imported users is cached per process. It is reloaded after an import
+# finishes, in this process or another one (NOTIFY on USERS_CHANNEL), and at least every
+# USERS_CACHE_TTL seconds in case a notification was missed.
+USERS_CACHE_TTL = int(os.getenv("USERS_CACHE_TTL", "300"))
+USERS_CHANNEL = "ai_persona_users_changed"
 
-def insert_new_user_to_pgsql_db(twitter_handle, status_text, progress_bar_tw, progress_bar_fc):
-    # Get database session
-    db = next(get_pgsql_db())
-    
+_users_lock = threading.Lock()
+_users = None
+_users_loaded_at = 0.0
+_users_listener = None
+
+def get_users():
+    # The returned users are detached from their session, treat them as read only
+    global _users, _users_loaded_at
+    _start_users_listener()
+    with _users_lock:
+        if _users is None or time.time() - _users_loaded_at > USERS_CACHE_TTL:
+            logger.debug("Loading users")
+            with SessionLocal() as db:
+                _users = db.query(User).filter(User.status == STATUS_FULLY_IMPORTED).order_by(User.id).all()
+            _users_loaded_at = time.time()
+        return _users
+
+def invalidate_users(notify=True):
+    # Call after any change to the users table; notify tells the other app processes as well
+    global _users
+    with _users_lock:
+        _users = None
+    if notify:
+        with engine.begin() as conn:
+            conn.execute(text(f"NOTIFY {USERS_CHANNEL}"))
+
+def _start_users_listener():
+    global _users_listener
+    with _users_lock:
+        if _users_listener is None:
+            _users_listener = threading.Thread(target=_listen_for_user_changes, name="users-listener", daemon=True)
+            _users_listener.start()
+
+def _listen_for_user_changes():
+    # LISTEN needs a dedicated connection outside the pool, kept open for the life of the process
+    while True:
+        try:
+            connection = psycopg2.connect(DATABASE_URL)
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            connection.cursor().execute(f"LISTEN {USERS_CHANNEL}")
+            while True:
+                if select.select([connection], [], [], 60) == ([], [], []):
+                    continue
+                connection.poll()
+                if connection.notifies:
+                    connection.notifies.clear()
+                    invalidate_users(notify=False)
+        except Exception as e:
+            # Changes may be missed while disconnected, so reload once reconnected
+            logger.warning("Users listener failed (%s), reconnecting", e)
+            invalidate_users(notify=False)
+            time.sleep(5)
+
+def insert_new_user_to_pgsql_db(twitter_handle, update_tw_progress: Callable[[int, str], None],
+                                update_fc_progress: Callable[[int, str], None]):
+    # Imports or refreshes a persona. Runs on an import job worker (see jobs.py), progress is
+    # reported through the callbacks as (percent, status text).
+    db = SessionLocal()
+    try:
+        return _insert_new_user(db, twitter_handle, update_tw_progress, update_fc_progress)
+    finally:
+        db.close()
+
+def _insert_new_user(db: Session, twitter_handle, update_tw_progress: Callable[[int, str], None],
+                     update_fc_progress: Callable[[int, str], None]):
     # 1. Check if user already exists
     existing_user = db.query(User).filter(User.name == twitter_handle).first()
     if existing_user:
+        # Already imported users are refreshed incrementally from their last imported tweet
         tw_user_id = existing_user.twitter_id
-        if existing_user.status == STATUS_FULLY_IMPORTED:
-            return "User already exists and is fully imported"
     else:
         # 2. Make API request to get user info
-        url = f"https://twitter241.p.rapidapi.com/user?username={twitter_handle}"
+        url = f"{TWITTER_API_BASE_URL}/user?username={twitter_handle}"
         headers = {
             "X-RapidAPI-Key": os.getenv("RAPID_API_KEY"),
             "X-RapidAPI-Host": "twitter241.p.rapidapi.com"
@@ -102,6 +211,7 @@ def insert_new_user_to_pgsql_db(twitter_handle, status_text, progress_bar_tw, pr
                 twitter_post_url_prefix=f"https://x.com/{twitter_handle}",
                 chroma_path=f"/tmp/chroma/twitter/{twitter_handle}",
                 twitter_id=tw_user_id,
+                embedding_model=EMBEDDING_MODEL,
                 status=STATUS_NOT_IMPORTED
             )
             
@@ -116,47 +226,72 @@ def insert_new_user_to_pgsql_db(twitter_handle, status_text, progress_bar_tw, pr
             return f"Error adding user: {str(e)}"
     
     # Update progress after successful database insertion
-    progress_bar_tw.progress(1)
-    status_text.text_area("Status", value=f"Successfully found Twitter user @{twitter_handle}", height=70, disabled=True, key="text1")
-    
-    # Define progress callback
-    def update_tw_progress(progress, status):
-        progress_bar_tw.progress(progress)
-        status_text.text_area("Status", value=status, height=70, disabled=True)
-
-    def update_fc_progress(progress, status):
-        progress_bar_fc.progress(progress)
-        # status_text.text_area("Status", value=status, height=70, disabled=True, key="text2")    
-        status_text.text(status)    
+    update_tw_progress(1, f"Successfully found Twitter user @{twitter_handle}")
     
-    print(f"twitter id: {tw_user_id}\n\n")
+    logger.info("twitter id: %s", tw_user_id)
     
-    # Import Twitter data with progress updates
-    num_tweets = import_twitter_data(tw_user_id, existing_user.chroma_path if existing_user else new_user.chroma_path, progress_callback=update_tw_progress)
-    
-    # If user has farcaster account, then crawl it as well:
-    fid = checkUserHasFarcaster(tw_user_id)
-    if fid:
-        # Reset progress bar for Farcaster import
-        progress_bar_fc.progress(0)
-        status_text.text_area("Status", value=f"Found Farcaster profile. Importing Farcaster data...", height=70, disabled=True)
-        
-        # Import Farcaster data with the Farcaster progress callback
-        num_casts = import_farcaster_data(fid, existing_user.chroma_path if existing_user else new_user.chroma_path, progress_callback=update_fc_progress)
+    chroma_path = existing_user.chroma_path if existing_user else new_user.chroma_path
+    since_tweet_id = existing_user.last_tweet_id if existing_user else None
+    embedding_model = existing_user.embedding_model if existing_user else new_user.embedding_model
 
-        if existing_user:
-            existing_user.farcaster_id = fid
+    async def import_farcaster(fetcher):
+        # If user has farcaster account, then crawl it as well:
+        fid = await checkUserHasFarcasterAsync(tw_user_id, fetcher)
+        if fid:
+            # Reset progress bar for Farcaster import
+            update_fc_progress(0, "Found Farcaster profile. Importing Farcaster data...")
+
+            # Import Farcaster data with the Farcaster progress callback
+            await import_farcaster_data_async(fid, chroma_path, progress_callback=update_fc_progress, fetcher=fetcher,
+                                              embedding_model=embedding_model)
         else:
-            new_user.farcaster_id = fid
-    else:
-        progress_bar_fc.progress(100)
-        status_text.text_area("Status", value=f"Farcaster profile not found.", height=70, disabled=True)
+            update_fc_progress(100, "Farcaster profile not found.")
+        return fid
+
+    async def import_all():
+        # Twitter and Farcaster share one rate limited HTTP client and run concurrently
+        async with Fetcher() as fetcher:
+            # Import Twitter data with progress updates, only the tweets newer than the last import
+            return await asyncio.gather(
+                import_twitter_data_async(tw_user_id, chroma_path, progress_callback=update_tw_progress, since_tweet_id=since_tweet_id,
+                                          fetcher=fetcher, embedding_model=embedding_model),
+                import_farcaster(fetcher),
+            )
+
+    # Keeps the store's client open through the import and the style profile, even if a chat turn
+    # evicts it from the store cache meanwhile
+    with keep_store_open(chroma_path):
+        (num_tweets, last_tweet_id), fid = asyncio.run(import_all())
+        if fid:
+            if existing_user:
+                existing_user.farcaster_id = fid
+            else:
+                new_user.farcaster_id = fid
+
+        # The store changed on disk, drop any cached handle to it
+        evict_vector_db(chroma_path)
+
+        # Distill the persona's writing style from everything imported so far
+        update_tw_progress(100, "Building style profile...")
+        try:
+            style_profile = build_style_profile(open_vector_db(chroma_path))
+        except Exception as e:
+            # The persona still works without a profile, it just relies on retrieved posts alone
+            logger.warning("Style profile failed for @%s: %s", twitter_handle, e)
+            style_profile = None
+    if style_profile:
+        (existing_user or new_user).style_profile = style_profile
 
     # Update user status to 9 after successful import
     if existing_user:
         existing_user.status = STATUS_FULLY_IMPORTED
+        existing_user.last_tweet_id = last_tweet_id
     else:
         new_user.status = STATUS_FULLY_IMPORTED
+        new_user.last_tweet_id = last_tweet_id
     db.commit()
+
+    # New or refreshed persona, every app process reloads its roster
+    invalidate_users()
     
-    return f"User successfully added/updated with {num_tweets} tweets" 
\ No newline at end of file
+    return f"User successfully added/updated with {num_tweets} new tweets" 
\ No newline at end of file
@@ -0,0 +1,294 @@
+import io
+import os
+import csv
+import json
+import math
+import threading
+from typing import Any, Iterable, Optional
+from sqlalchemy import create_engine, text
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from lexical_index import query_terms
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Persona vectors in PostgreSQL with the pgvector extension, used with VECTOR_STORE_MODE=pgvector.
+# Defaults to the database of the users table, so every app replica sees the same durable index.
+PGVECTOR_DATABASE_URL = os.getenv("PGVECTOR_DATABASE_URL") or (
+    f"postgresql://{os.getenv('DB_USER', 'postgres')}:{os.getenv('DB_PASSWORD', '')}"
+    f"@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME', 'persona_users')}"
+)
+PGVECTOR_INDEX = os.getenv("PGVECTOR_INDEX", "hnsw")  # "hnsw" or "ivfflat"
+PGVECTOR_HNSW_EF_SEARCH = int(os.getenv("PGVECTOR_HNSW_EF_SEARCH", "100"))
+# IVFFlat lists; empty for rows / 1000 (sqrt(rows) above 1M rows), computed when the index is built
+PGVECTOR_IVFFLAT_LISTS = int(os.getenv("PGVECTOR_IVFFLAT_LISTS") or "0")
+PGVECTOR_IVFFLAT_PROBES = int(os.getenv("PGVECTOR_IVFFLAT_PROBES", "20"))
+
+# All personas share one ANN index per dimension, which finds the nearest rows overall before they
+# are filtered to one persona. Personas with up to PGVECTOR_EXACT_SEARCH_MAX_ROWS posts are searched
+# exactly instead; larger ones keep scanning the index until enough of their rows are found
+# (iterative scans, pgvector 0.8+; set PGVECTOR_ITERATIVE_SCAN=off on older versions).
+PGVECTOR_EXACT_SEARCH_MAX_ROWS = int(os.getenv("PGVECTOR_EXACT_SEARCH_MAX_ROWS", "20000"))
+PGVECTOR_ITERATIVE_SCAN = os.getenv("PGVECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+# One row per persona store (keyed by the user's chroma_path) with the embedding model it uses.
+# Vectors live in one table per dimension, since a pgvector index needs a fixed dimension.
+STORES_TABLE = "ai_persona_vector_stores"
+
+_lock = threading.Lock()
+_engine = None
+_ready_tables = set()
+
+
+def get_engine():
+    global _engine
+    with _lock:
+        if _engine is None:
+            _engine = create_engine(PGVECTOR_DATABASE_URL, pool_pre_ping=True)
+            with _engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+                conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {STORES_TABLE} ("
+                    "store_path VARCHAR(255) PRIMARY KEY, embedding_model VARCHAR(100) NOT NULL, dimension INTEGER)"
+                ))
+                conn.execute(text(f"ALTER TABLE {STORES_TABLE} ADD COLUMN IF NOT EXISTS num_rows INTEGER NOT NULL DEFAULT 0"))
+        return _engine
+
+
+def _embeddings_table(dimension):
+    return f"ai_persona_embeddings_{int(dimension)}"
+
+
+def _ensure_embeddings_table(dimension):
+    table = _embeddings_table(dimension)
+    if table in _ready_tables:
+        return table
+
+    with get_engine().begin() as conn:
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "store_path VARCHAR(255) NOT NULL, doc_id VARCHAR(255) NOT NULL, content TEXT NOT NULL, "
+            f"metadata JSONB NOT NULL, embedding vector({int(dimension)}) NOT NULL, PRIMARY KEY (store_path, doc_id))"
+        ))
+        # IVFFlat clusters the vectors present when it is built, so it is only built once they are
+        # loaded (build_ivfflat_index); until then searches are exact
+        if PGVECTOR_INDEX != "ivfflat":
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_embedding_idx ON {table} USING hnsw (embedding vector_cosine_ops)"))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_source_idx ON {table} (store_path, (metadata->>'source'))"))
+        # Full-text index for hybrid retrieval, so every replica sees new posts (the lexical_index.py
+        # SQLite file is local to the replica that imported them)
+        conn.execute(text(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+            "GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED"
+        ))
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table}_content_tsv_idx ON {table} USING gin (content_tsv)"))
+    _ready_tables.add(table)
+    return table
+
+
+def build_ivfflat_index(dimension):
+    # (Re)build the IVFFlat index of a dimension table from the vectors it holds now. Run after
+    # loading (migrate_vector_stores.py does) and again when the table has grown a lot.
+    table = _ensure_embeddings_table(dimension)
+    with get_engine().begin() as conn:
+        rows = conn.execute(text(f"SELECT count(*) FROM {table}")).scalar()
+        lists = PGVECTOR_IVFFLAT_LISTS or max(1, rows // 1000 if rows <= 1_000_000 else int(math.sqrt(rows)))
+        conn.execute(text(f"DROP INDEX IF EXISTS {table}_embedding_idx"))
+        conn.execute(text(
+            f"CREATE INDEX {table}_embedding_idx ON {table} USING ivfflat (embedding vector_cosine_ops) WITH (lists = {lists})"
+        ))
+    return rows, lists
+
+
+def _vector_literal(vector):
+    return "[" + ",".join(str(float(value)) for value in vector) + "]"
+
+
+class PgVectorStore(VectorStore):
+    # A persona store in Postgres with the subset of the Chroma interface the app uses:
+    # relevance-scored search, get(where=...) and add_documents(ids=...). Scores are cosine distances.
+
+    def __init__(self, store_path, embedding_function: Embeddings, embedding_model, dimension=None):
+        self.store_path = store_path
+        self.embedding_function = embedding_function
+        self.embedding_model = embedding_model
+        self.dimension = dimension
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def _select_relevance_score_fn(self):
+        return self._cosine_relevance_score_fn
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list[dict]] = None,
+                  ids: Optional[list[str]] = None, **kwargs: Any) -> list[str]:
+        texts = list(texts)
+        if ids is None:
+            raise ValueError("PgVectorStore needs explicit ids")
+        return self.add_embeddings(ids, texts, self.embedding_function.embed_documents(texts), metadatas)
+
+    def add_embeddings(self, ids, texts, embeddings, metadatas=None) -> list[str]:
+        # Bulk upsert: the rows are streamed in with COPY to a temporary table, then merged by id
+        if not ids:
+            return []
+        metadatas = metadatas or [{} for _ in ids]
+        if self.dimension is None:
+            self._set_dimension(len(embeddings[0]))
+        table = _ensure_embeddings_table(self.dimension)
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for doc_id, content, embedding, metadata in zip(ids, texts, embeddings, metadatas):
+            writer.writerow([doc_id, content, json.dumps(metadata or {}), _vector_literal(embedding)])
+        buffer.seek(0)
+
+        connection = get_engine().raw_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE import_rows (doc_id TEXT, content TEXT, metadata JSONB, "
+                f"embedding vector({self.dimension})) ON COMMIT DROP"
+            )
+            cursor.copy_expert("COPY import_rows (doc_id, content, metadata, embedding) FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(
+                f"INSERT INTO {table} (store_path, doc_id, content, metadata, embedding) "
+                "SELECT %s, doc_id, content, metadata, embedding FROM import_rows "
+                "ON CONFLICT (store_path, doc_id) DO UPDATE SET content = EXCLUDED.content, "
+                "metadata = EXCLUDED.metadata, embedding = EXCLUDED.embedding",
+                (self.store_path,)
+            )
+            # The store size decides between exact and index search
+            cursor.execute(
+                f"UPDATE {STORES_TABLE} SET num_rows = (SELECT count(*) FROM {table} WHERE store_path = %s) "
+                "WHERE store_path = %s",
+                (self.store_path, self.store_path)
+            )
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+        return list(ids)
+
+    def _set_dimension(self, dimension):
+        with get_engine().begin() as conn:
+            conn.execute(
+                text(f"UPDATE {STORES_TABLE} SET dimension = :dimension WHERE store_path = :store_path"),
+                {"dimension": dimension, "store_path": self.store_path}
+            )
+        self.dimension = dimension
+
+    def similarity_search_by_vector_with_relevance_scores(self, embedding, k=4, **kwargs) -> list[tuple[Document, float]]:
+        # Named like Chroma's, and like Chroma it returns distances rather than relevance scores
+        if self.dimension is None:
+            return []
+        table = _ensure_embeddings_table(self.dimension)
+        with get_engine().begin() as conn:
+            num_rows = conn.execute(
+                text(f"SELECT num_rows FROM {STORES_TABLE} WHERE store_path = :store_path"),
+                {"store_path": self.store_path}
+            ).scalar() or 0
+            if num_rows <= PGVECTOR_EXACT_SEARCH_MAX_ROWS:
+                # Exact distances over this persona's rows, found through the primary key
+                conn.execute(text("SET LOCAL enable_indexscan = off"))
+            elif PGVECTOR_INDEX == "ivfflat":
+                conn.execute(text(f"SET LOCAL ivfflat.probes = {PGVECTOR_IVFFLAT_PROBES}"))
+                if PGVECTOR_ITERATIVE_SCAN != "off":
+                    conn.execute(text("SET LOCAL ivfflat.iterative_scan = relaxed_order"))
+            else:
+                conn.execute(text(f"SET LOCAL hnsw.ef_search = {PGVECTOR_HNSW_EF_SEARCH}"))
+                if PGVECTOR_ITERATIVE_SCAN != "off":
+                    conn.execute(text(f"SET LOCAL hnsw.iterative_scan = {PGVECTOR_ITERATIVE_SCAN}"))
+            rows = conn.execute(
+                text(
+                    f"SELECT content, metadata, embedding <=> CAST(:embedding AS vector) AS distance FROM {table} "
+                    "WHERE store_path = :store_path ORDER BY distance LIMIT :k"
+                ),
+                {"embedding": _vector_literal(embedding), "store_path": self.store_path, "k": k}
+            ).fetchall()
+        return [(Document(page_content=content, metadata=metadata), distance) for content, metadata, distance in rows]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_relevance_scores(self.embedding_function.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs) -> list[Document]:
+        return [doc for doc, _distance in self.similarity_search_with_score(query, k)]
+
+    def search_lexical(self, question, k) -> list[tuple[Document, float]]:
+        # [(Document, ts_rank_cd score)], best first: posts matching any of the question's terms
+        terms = query_terms(question)
+        if self.dimension is None or not terms:
+            return []
+        table = _ensure_embeddings_table(self.dimension)
+        # Terms (lexical_index._TERM) are word characters with a leading $, # or @ and inner dots, never
+        # a double quote, so each one can be quoted: websearch_to_tsquery reads a quoted term as a phrase
+        # and gives none of its characters operator meaning. It is then parsed like content_tsv ('simple').
+        query = " OR ".join(f'"{term}"' for term in terms)
+        with get_engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    f"SELECT content, metadata, ts_rank_cd(content_tsv, query) AS rank "
+                    f"FROM {table}, websearch_to_tsquery('simple', :query) AS query "
+                    "WHERE store_path = :store_path AND content_tsv @@ query ORDER BY rank DESC LIMIT :k"
+                ),
+                {"query": query, "store_path": self.store_path, "k": k}
+            ).fetchall()
+        return [(Document(page_content=content, metadata=metadata), rank) for content, metadata, rank in rows]
+
+    def get(self, where=None, include=None, limit=None, offset=None) -> dict:
+        # Chroma-style get. `where` supports {"field": value} and {"field": {"$in": [...]}} on metadata,
+        # "embeddings" in include adds the vectors.
+        with_embeddings = "embeddings" in (include or [])
+        result = {"ids": [], "documents": [], "metadatas": [], "embeddings": [] if with_embeddings else None}
+        if self.dimension is None:
+            return result
+
+        conditions = ["store_path = :store_path"]
+        params = {"store_path": self.store_path}
+        for i, (field, condition) in enumerate((where or {}).items()):
+            params[f"field_{i}"] = field
+            if isinstance(condition, dict) and "$in" in condition:
+                conditions.append(f"metadata->>:field_{i} = ANY(:values_{i})")
+                params[f"values_{i}"] = [str(value) for value in condition["$in"]]
+            else:
+                conditions.append(f"metadata->>:field_{i} = :value_{i}")
+                params[f"value_{i}"] = str(condition)
+
+        columns = "doc_id, content, metadata" + (", embedding::text" if with_embeddings else "")
+        query = f"SELECT {columns} FROM {_ensure_embeddings_table(self.dimension)} WHERE {' AND '.join(conditions)} ORDER BY doc_id"
+        if limit is not None:
+            query += f" LIMIT {int(limit)} OFFSET {int(offset or 0)}"
+        with get_engine().connect() as conn:
+            for row in conn.execute(text(query), params):
+                result["ids"].append(row[0])
+                result["documents"].append(row[1])
+                result["metadatas"].append(row[2])
+                if with_embeddings:
+                    result["embeddings"].append(json.loads(row[3]))
+        return result
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        store_embedding_model, dimension = get_store_embedding_model(kwargs["store_path"], kwargs["embedding_model"])
+        store = cls(kwargs["store_path"], embedding, store_embedding_model, dimension)
+        store.add_texts(texts, metadatas, ids=kwargs.get("ids"))
+        return store
+
+
+def get_store_embedding_model(store_path, embedding_model):
+    # Registers a new store with embedding_model; returns its recorded (embedding model, dimension)
+    with get_engine().begin() as conn:
+        conn.execute(
+            text(f"INSERT INTO {STORES_TABLE} (store_path, embedding_model) VALUES (:store_path, :embedding_model) "
+                 "ON CONFLICT (store_path) DO NOTHING"),
+            {"store_path": store_path, "embedding_model": embedding_model}
+        )
+        return tuple(conn.execute(
+            text(f"SELECT embedding_model, dimension FROM {STORES_TABLE} WHERE store_path = :store_path"),
+            {"store_path": store_path}
+        ).one())
@@ -0,0 +1,59 @@
+from functools import lru_cache
+from langchain.schema import HumanMessage, SystemMessage
+
+# Prompt assembly. OpenAI caches the longest prompt prefix it has seen recently, so every prompt
+# starts with what does not change between turns (persona, style profile and instructions, in the
+# system message) and ends with what does (conversation history, then timeline context and question).
+# Templates are plain format strings, parsed once when they are used.
+
+ANSWER_INSTRUCTIONS = """
+Provide a direct response mimicking my style, based on the timeline content given with the question when there is any,
+and include only the response itself without any additional text.
+"""
+
+QUESTION_PROMPT = """
+Timeline content:
+{context}
+
+---
+
+Answer the question based on the above context:  {question}
+"""
+
+NO_CONTEXT_QUESTION_PROMPT = """
+Answer the question:  {question}
+"""
+
+FOLLOW_UP_SYSTEM_PROMPT = "You are a helpful assistant that generates relevant follow-up questions."
+
+FOLLOW_UP_PROMPT = """
+What else should I ask about this:
+{context}
+
+Generate 1 relevant follow-up question that would help the user learn more about this topic.
+Format each question that starts with "Would you like to know more about...".
+Make the questions specific and related to the context.
+"""
+
+
+@lru_cache(maxsize=256)
+def get_persona_system_message(persona, style_profile=None):
+    # The stable prefix of every answer prompt for this persona
+    if style_profile:
+        return SystemMessage(content=f"{persona}\n\n{style_profile}\n{ANSWER_INSTRUCTIONS}")
+    return SystemMessage(content=f"{persona}\n{ANSWER_INSTRUCTIONS}")
+
+
+def format_question_prompt(question, context_text=""):
+    if not context_text:
+        return NO_CONTEXT_QUESTION_PROMPT.format(question=question)
+    return QUESTION_PROMPT.format(context=context_text, question=question)
+
+
+def build_answer_messages(persona, question_prompt, history_messages=None, style_profile=None):
+    return [get_persona_system_message(persona, style_profile), *(history_messages or []), HumanMessage(content=question_prompt)]
+
+
+def build_follow_up_messages(question):
+    return [SystemMessage(content=FOLLOW_UP_SYSTEM_PROMPT), HumanMessage(content=FOLLOW_UP_PROMPT.format(context=question))]
+
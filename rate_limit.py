@@ -0,0 +1,46 @@
+import time
+import asyncio
+import threading
+
+
+class TokenBucket:
+    # Token bucket that can be shared across threads and event loops: callers reserve a
+    # token under a plain lock and then sleep (asynchronously or not) until it becomes available.
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _reserve(self):
+        # Take one token and return how long to wait before it is ours (tokens may go negative)
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def try_acquire(self):
+        # Take a token only if one is available right now, for callers that reject instead of waiting
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    async def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_blocking(self):
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
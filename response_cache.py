@@ -0,0 +1,126 @@
+import os
+import logging
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Semantic cache of persona answers, stored in a local SQLite file
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "/tmp/ai_persona/response_cache.sqlite3")
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))  # Min cosine similarity for a hit
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", str(24 * 60 * 60)))  # Seconds
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+
+_lock = threading.Lock()
+_connection = None
+
+
+def _get_connection():
+    global _connection
+    if _connection is None:
+        os.makedirs(os.path.dirname(RESPONSE_CACHE_PATH), exist_ok=True)
+        _connection = sqlite3.connect(RESPONSE_CACHE_PATH, check_same_thread=False)
+        _connection.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                persona_hash TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                references_json TEXT NOT NULL,
+                follow_ups TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL
+            )
+        """)
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_key ON response_cache (user_id, persona_hash)")
+        _connection.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache (last_used_at)")
+        _connection.commit()
+    return _connection
+
+
+def normalize_question(question):
+    # Collapse whitespace so trivially different spellings share an embedding
+    return re.sub(r"\s+", " ", question).strip()
+
+
+def _hash_persona(persona, embedding_model):
+    # Embeddings from different models are not comparable, so the model is part of the key
+    return hashlib.sha256(f"{embedding_model}\n{persona}".encode("utf-8")).hexdigest()
+
+
+def _unit_vector(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def lookup_response(user_id, persona, question_embedding, embedding_model):
+    # Returns the cached answer closest to the question, if it is similar enough and not expired
+    if not RESPONSE_CACHE_ENABLED:
+        return None
+
+    query = _unit_vector(question_embedding)
+    now = time.time()
+    with _lock:
+        db = _get_connection()
+        rows = db.execute(
+            "SELECT id, embedding, answer, references_json, follow_ups FROM response_cache "
+            "WHERE user_id = ? AND persona_hash = ? AND created_at >= ?",
+            (user_id, _hash_persona(persona, embedding_model), now - RESPONSE_CACHE_TTL)
+        ).fetchall()
+        if not rows:
+            return None
+
+        # Stored embeddings are unit length, so the dot product is the cosine similarity
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        similarities = matrix @ query
+        best = int(np.argmax(similarities))
+        logger.debug("Response cache best similarity: %.4f", similarities[best])
+        if similarities[best] < RESPONSE_CACHE_THRESHOLD:
+            return None
+
+        row = rows[best]
+        db.execute("UPDATE response_cache SET last_used_at = ? WHERE id = ?", (now, row[0]))
+        db.commit()
+
+    return {
+        "answer": row[2],
+        "references": json.loads(row[3]),
+        "follow_ups": row[4],
+    }
+
+
+def store_response(user_id, persona, question, question_embedding, embedding_model, answer, references, follow_ups):
+    if not RESPONSE_CACHE_ENABLED:
+        return
+
+    now = time.time()
+    with _lock:
+        db = _get_connection()
+        db.execute(
+            "INSERT INTO response_cache (user_id, persona_hash, question, embedding, answer, references_json, follow_ups, created_at, last_used_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, _hash_persona(persona, embedding_model), question, _unit_vector(question_embedding).tobytes(),
+             answer, json.dumps(references), follow_ups, now, now)
+        )
+
+        # Drop expired entries, then the least recently used ones beyond the size limit
+        db.execute("DELETE FROM response_cache WHERE created_at < ?", (now - RESPONSE_CACHE_TTL,))
+        db.execute(
+            "DELETE FROM response_cache WHERE id NOT IN "
+            "(SELECT id FROM response_cache ORDER BY last_used_at DESC LIMIT ?)",
+            (RESPONSE_CACHE_MAX_ENTRIES,)
+        )
+        db.commit()
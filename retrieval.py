@@ -0,0 +1,193 @@
+import os
+import logging
+import re
+import tiktoken
+from dotenv import load_dotenv
+from lexical_index import has_lexical_index, build_lexical_index, search_lexical_index, count_matched_terms
+from telemetry import timed
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Retrieval policy: fetch RETRIEVAL_FETCH_K candidates, drop the ones below RETRIEVAL_MIN_SCORE,
+# then keep only the hits close to the best one (within RETRIEVAL_SCORE_MARGIN), between
+# RETRIEVAL_MIN_K and RETRIEVAL_MAX_K of them. Scores are relevance scores in [0, 1].
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_MIN_K = int(os.getenv("RETRIEVAL_MIN_K", "3"))
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "10"))
+RETRIEVAL_MIN_SCORE = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.5"))
+RETRIEVAL_SCORE_MARGIN = float(os.getenv("RETRIEVAL_SCORE_MARGIN", "0.1"))
+# Personas with a style profile already show their style in the prompt, so fewer posts are needed
+RETRIEVAL_MAX_K_WITH_STYLE_PROFILE = int(os.getenv("RETRIEVAL_MAX_K_WITH_STYLE_PROFILE", "5"))
+
+# Hybrid retrieval: the relevant vector hits are fused with the persona's top RETRIEVAL_LEXICAL_K
+# BM25 hits by reciprocal rank fusion, so exact tickers, ENS names and hashtags are not missed.
+# A BM25 hit only counts if it has RETRIEVAL_LEXICAL_MIN_TERMS of the question's words (all of
+# them for shorter questions), and only when at least one vector hit passed the relevance floor.
+RETRIEVAL_HYBRID = os.getenv("RETRIEVAL_HYBRID", "true").lower() == "true"
+RETRIEVAL_LEXICAL_K = int(os.getenv("RETRIEVAL_LEXICAL_K", "5"))
+RETRIEVAL_LEXICAL_MIN_TERMS = int(os.getenv("RETRIEVAL_LEXICAL_MIN_TERMS", "2"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+
+# Context assembly: at most CONTEXT_TOKEN_BUDGET tokens of tweets, picked by maximal marginal
+# relevance (CONTEXT_MMR_LAMBDA = 1 is pure relevance), skipping near-duplicates of a picked tweet
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))  # Word overlap (Jaccard)
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+CONTEXT_ENCODING_MODEL = "gpt-4.1"  # The chat model in app.py
+
+try:
+    _encoding = tiktoken.encoding_for_model(CONTEXT_ENCODING_MODEL)
+except KeyError:
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+
+def search_vector_db(vector_db, question, query_embedding=None, k=RETRIEVAL_FETCH_K):
+    # [(Document, relevance score)], best first. Reuses the question embedding if there is one.
+    if query_embedding is None:
+        return vector_db.similarity_search_with_relevance_scores(question, k=k)
+
+    relevance_score_fn = vector_db._select_relevance_score_fn()
+    return [
+        (doc, relevance_score_fn(distance))
+        for doc, distance in vector_db.similarity_search_by_vector_with_relevance_scores(query_embedding, k=k)
+    ]
+
+
+def select_relevant_results(results, max_k=RETRIEVAL_MAX_K):
+    # Apply the retrieval policy to search results sorted best first. Returns [] when nothing is
+    # relevant enough, in which case the answer is generated without timeline context.
+    relevant = [(doc, score) for doc, score in results if score >= RETRIEVAL_MIN_SCORE]
+    if not relevant:
+        return []
+
+    # A tight cluster at the top means those few tweets are what the question is about; a flat
+    # distribution lets more of them in, up to RETRIEVAL_MAX_K
+    cutoff = relevant[0][1] - RETRIEVAL_SCORE_MARGIN
+    k = sum(1 for _doc, score in relevant if score >= cutoff)
+    k = max(min(RETRIEVAL_MIN_K, max_k), min(max_k, k))
+    return relevant[:k]
+
+
+def search_lexical(vector_db, chroma_path, question, k=RETRIEVAL_LEXICAL_K):
+    # Stores with their own full-text index (pgvector) are searched in place
+    if hasattr(vector_db, "search_lexical"):
+        return vector_db.search_lexical(question, k)
+    if not has_lexical_index(chroma_path):
+        build_lexical_index(chroma_path, vector_db)
+    return search_lexical_index(chroma_path, question, k)
+
+
+def select_lexical_results(question, results):
+    # The search matches any one of the question's words, so a single common word would do
+    selected = []
+    for doc, score in results:
+        matched, total = count_matched_terms(question, doc.page_content)
+        if matched and matched >= min(RETRIEVAL_LEXICAL_MIN_TERMS, total):
+            selected.append((doc, score))
+    return selected
+
+
+def _result_key(doc):
+    return (doc.metadata.get("type", "TW"), doc.metadata.get("source", doc.page_content))
+
+
+def fuse_results(*ranked_results, k=RETRIEVAL_RRF_K):
+    # Reciprocal rank fusion: sum of 1 / (k + rank) over the lists a post appears in. Scores are
+    # rescaled so the best post has 1.0, which keeps them usable as relevance for build_context().
+    scores = {}
+    docs = {}
+    for results in ranked_results:
+        for rank, (doc, _score) in enumerate(results, start=1):
+            key = _result_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+
+    if not scores:
+        return []
+    best = max(scores.values())
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [(docs[key], scores[key] / best) for key in ranked]
+
+
+def retrieve(vector_db, chroma_path, question, query_embedding=None, max_k=RETRIEVAL_MAX_K):
+    # The retrieval used for answers: relevance-gated vector hits, fused with BM25 hits if enabled.
+    # Returns (results best first, number of vector candidates looked at).
+    with timed("retrieval.vector"):
+        candidates = search_vector_db(vector_db, question, query_embedding)
+    results = select_relevant_results(candidates, max_k)
+    # Fusion rescales scores so the best post has 1.0. Without a relevant vector hit the question is
+    # not about the timeline, and lexical hits alone would fill the context with full scores.
+    if RETRIEVAL_HYBRID and results:
+        with timed("retrieval.lexical"):
+            lexical_results = select_lexical_results(question, search_lexical(vector_db, chroma_path, question))
+        logger.debug("Lexical hits: %s", [round(score, 2) for _doc, score in lexical_results])
+        results = fuse_results(results, lexical_results)[:max_k]
+    return results, len(candidates)
+
+
+def count_tokens(text):
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    tokens = _encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return _encoding.decode(tokens[:max_tokens])
+
+
+def _word_set(text):
+    # Retweets and thread repeats differ by "RT @user:", links and mentions, so those are ignored
+    text = re.sub(r"^RT @\w+:\s*", "", text)
+    text = re.sub(r"https?://\S+|@\w+", " ", text.lower())
+    return frozenset(re.findall(r"\w+", text))
+
+
+def _similarity(words, other_words):
+    if not words or not other_words:
+        return 0.0
+    return len(words & other_words) / len(words | other_words)
+
+
+def build_context(results):
+    # Join the selected hits into the prompt context. Returns (context_text, results actually used,
+    # token stats). Similarity between tweets is word overlap, so no extra embedding calls are needed.
+    candidates = [(doc, score, _word_set(doc.page_content), count_tokens(doc.page_content)) for doc, score in results]
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    full_tokens = sum(tokens for *_rest, tokens in candidates) + separator_tokens * max(0, len(candidates) - 1)
+
+    picked = []
+    used_tokens = 0
+    duplicates = 0
+    while candidates:
+        # MMR: relevance to the question minus similarity to what is already in the context
+        def mmr(candidate):
+            redundancy = max((_similarity(candidate[2], words) for _doc, _score, words, _tokens in picked), default=0.0)
+            return CONTEXT_MMR_LAMBDA * candidate[1] - (1 - CONTEXT_MMR_LAMBDA) * redundancy
+
+        best = candidates.pop(max(range(len(candidates)), key=lambda i: mmr(candidates[i])))
+
+        doc, score, words, tokens = best
+        if any(_similarity(words, picked_words) >= CONTEXT_DUPLICATE_THRESHOLD for _doc, _score, picked_words, _tokens in picked):
+            duplicates += 1
+            continue
+        cost = tokens + (separator_tokens if picked else 0)
+        if used_tokens + cost > CONTEXT_TOKEN_BUDGET:
+            # A shorter tweet further down may still fit
+            continue
+        picked.append(best)
+        used_tokens += cost
+
+    stats = {
+        "tokens": used_tokens,
+        "tokens_saved": full_tokens - used_tokens,
+        "documents": len(picked),
+        "duplicates": duplicates,
+        "over_budget": len(results) - len(picked) - duplicates,
+    }
+    context_text = CONTEXT_SEPARATOR.join(doc.page_content for doc, *_rest in picked)
+    return context_text, [(doc, score) for doc, score, *_rest in picked], stats
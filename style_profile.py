@@ -0,0 +1,136 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+from lexical_index import STOP_WORDS
+
+# Load environment variables
+load_dotenv()
+
+# A compact description of how a persona writes, computed once per import and kept on the user row.
+# It goes into the persona's stable system prompt, so fewer retrieved tweets are needed per turn.
+STYLE_PROFILE_MAX_POSTS = int(os.getenv("STYLE_PROFILE_MAX_POSTS", "2000"))
+STYLE_PROFILE_EXEMPLARS = int(os.getenv("STYLE_PROFILE_EXEMPLARS", "6"))
+STYLE_PROFILE_PHRASES = int(os.getenv("STYLE_PROFILE_PHRASES", "10"))
+STYLE_EXEMPLAR_MAX_CHARS = 280
+
+_WORD = re.compile(r"[$#]?\w+(?:\.\w+)*")
+_NOISE = re.compile(r"https?://\S+|@\w+")
+_EMOJI = re.compile("[\U0001F300-\U0001FAFF☀-➿]")
+# Unicode character name prefix -> writing system, a dependency-free stand-in for language detection
+_SCRIPTS = (("CJK", "Chinese"), ("HIRAGANA", "Japanese"), ("KATAKANA", "Japanese"), ("HANGUL", "Korean"),
+            ("CYRILLIC", "Cyrillic"), ("ARABIC", "Arabic"), ("LATIN", "Latin"))
+
+
+def _is_original(text):
+    # Retweets show someone else's writing
+    return not text.startswith("RT @")
+
+
+def _words(text):
+    return _WORD.findall(_NOISE.sub(" ", text.lower()))
+
+
+def _kmeans(vectors, k, iterations=10):
+    # Plain k-means on unit vectors (cosine), deterministic. Returns the cluster of each vector.
+    rng = np.random.default_rng(0)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)]
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(k):
+            members = vectors[labels == cluster]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[cluster] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return np.argmax(vectors @ centroids.T, axis=1), centroids
+
+
+def choose_exemplars(texts, embeddings, count=STYLE_PROFILE_EXEMPLARS):
+    # One post per topic cluster, the one closest to the cluster centre, biggest clusters first
+    if not texts:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    k = min(count, len(texts))
+    labels, centroids = _kmeans(vectors, k)
+
+    exemplars = []
+    for cluster, _size in Counter(labels.tolist()).most_common():
+        members = np.flatnonzero(labels == cluster)
+        best = members[np.argmax(vectors[members] @ centroids[cluster])]
+        if texts[best] not in exemplars:
+            exemplars.append(texts[best])
+    return exemplars
+
+
+def common_phrases(texts, count=STYLE_PROFILE_PHRASES):
+    # Recurring 2-3 word phrases that are not just stop words, used in at least 3 posts
+    counts = Counter()
+    for text in texts:
+        words = _words(text)
+        phrases = set()
+        for n in (2, 3):
+            for i in range(len(words) - n + 1):
+                phrase = words[i:i + n]
+                if not all(word in STOP_WORDS for word in phrase):
+                    phrases.add(" ".join(phrase))
+        counts.update(phrases)
+
+    # Keep one of overlapping phrases ("building on", "building on ethereum"), the more frequent
+    chosen = []
+    for phrase, used in counts.most_common():
+        if used < 3 or len(chosen) == count:
+            break
+        if not any(phrase in other or other in phrase for other in chosen):
+            chosen.append(phrase)
+    return chosen
+
+
+def _script(char):
+    name = unicodedata.name(char, "")
+    for prefix, script in _SCRIPTS:
+        if name.startswith(prefix):
+            return script
+    return None
+
+
+def language_mix(texts):
+    # Share of posts by dominant writing system, [(script, share)] largest first
+    scripts = Counter()
+    for text in texts:
+        letters = Counter(script for script in map(_script, _NOISE.sub(" ", text)) if script)
+        if letters:
+            scripts[letters.most_common(1)[0][0]] += 1
+    total = sum(scripts.values())
+    return [(script, used / total) for script, used in scripts.most_common()] if total else []
+
+
+def build_style_profile(vector_db, max_posts=STYLE_PROFILE_MAX_POSTS):
+    # Profile text for the persona's store, or None if it has no original posts
+    stored = vector_db.get(include=["documents", "embeddings"], limit=max_posts)
+    posts = [
+        (text, embedding)
+        for text, embedding in zip(stored["documents"], stored["embeddings"])
+        if text and _is_original(text)
+    ]
+    if not posts:
+        return None
+    texts = [text for text, _embedding in posts]
+
+    words_per_post = np.mean([len(_words(text)) for text in texts])
+    with_emoji = np.mean([bool(_EMOJI.search(text)) for text in texts])
+    with_hashtags = np.mean(["#" in text for text in texts])
+    lines = [
+        f"Writing style, from {len(texts)} of my posts:",
+        f"- About {words_per_post:.0f} words per post; {with_emoji:.0%} use emoji, {with_hashtags:.0%} use hashtags",
+        "- Languages: " + ", ".join(f"{script} {share:.0%}" for script, share in language_mix(texts)),
+    ]
+    phrases = common_phrases(texts)
+    if phrases:
+        lines.append("- Phrases I often use: " + ", ".join(f'"{phrase}"' for phrase in phrases))
+    lines.append("Typical posts:")
+    for text in choose_exemplars(texts, [embedding for _text, embedding in posts]):
+        lines.append("- " + " ".join(text.split())[:STYLE_EXEMPLAR_MAX_CHARS])
+    return "\n".join(lines)
@@ -0,0 +1,180 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from opentelemetry import context, metrics, trace
+from opentelemetry.trace import Status, StatusCode
+from langchain_core.callbacks import BaseCallbackHandler
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Leveled logging, plus an OpenTelemetry span and duration metric for every stage of a chat turn
+# (retrieval, prompt assembly, each LLM call) and of an import (each API request, embedding + save
+# batch). Spans and metrics are no-ops until configure_telemetry() runs with
+# OTEL_EXPORTER_OTLP_ENDPOINT set; they are then exported over OTLP, e.g. to an OpenTelemetry
+# Collector that serves them to Prometheus.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+OTEL_EXPORTER_OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "ai-persona")
+OTEL_METRIC_EXPORT_INTERVAL_MS = int(os.getenv("OTEL_METRIC_EXPORT_INTERVAL_MS", "15000"))
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("ai_persona")
+meter = metrics.get_meter("ai_persona")
+stage_duration = meter.create_histogram(
+    "ai_persona.stage.duration", unit="s", description="Duration of a chat turn or import stage"
+)
+llm_time_to_first_token = meter.create_histogram(
+    "ai_persona.llm.time_to_first_token", unit="s", description="Time to the first streamed token of an LLM call"
+)
+llm_tokens = meter.create_counter(
+    "ai_persona.llm.tokens", unit="{token}", description="LLM tokens by call and kind (prompt, cached, completion)"
+)
+embedding_tokens = meter.create_counter(
+    "ai_persona.embedding.tokens", unit="{token}", description="Tokens sent to the embedding model"
+)
+
+_lock = threading.Lock()
+_configured = False
+
+
+def configure_telemetry():
+    # Once per process, from the entry points (app.py, scripts). Modules only get loggers.
+    global _configured
+    with _lock:
+        if _configured:
+            return
+        _configured = True
+
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # httpx logs every request at INFO, the fetcher already reports what matters
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    if not OTEL_EXPORTER_OTLP_ENDPOINT:
+        return
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+
+    # The exporters read the endpoint (and OTEL_EXPORTER_OTLP_HEADERS etc.) from the environment
+    resource = Resource.create({"service.name": OTEL_SERVICE_NAME})
+    tracer_provider = TracerProvider(resource=resource)
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+    metrics.set_meter_provider(MeterProvider(resource=resource, metric_readers=[
+        PeriodicExportingMetricReader(OTLPMetricExporter(), export_interval_millis=OTEL_METRIC_EXPORT_INTERVAL_MS)
+    ]))
+    logger.info("Exporting traces and metrics to %s", OTEL_EXPORTER_OTLP_ENDPOINT)
+
+
+def record_duration(stage, seconds, attributes=None):
+    stage_duration.record(seconds, {"stage": stage, **(attributes or {})})
+    logger.debug("%s took %.1f ms", stage, seconds * 1000)
+
+
+@contextmanager
+def timed(stage, attributes=None, current=True):
+    # A span named after the stage and its duration in the stage histogram. Yields the span, for
+    # attributes only known at the end (result counts, tokens). Use current=False inside async
+    # generators: they can be suspended while the span is open, so it must not become the current one.
+    started = time.perf_counter()
+    span = tracer.start_span(stage, attributes=attributes)
+    token = context.attach(trace.set_span_in_context(span)) if current else None
+    failed = False
+    try:
+        yield span
+    except Exception as e:
+        failed = True
+        span.record_exception(e)
+        span.set_status(Status(StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        if token is not None:
+            context.detach(token)
+        span.end()
+        record_duration(stage, time.perf_counter() - started, {"error": failed})
+
+
+class LLMCallTelemetry(BaseCallbackHandler):
+    # A span, duration, time to first token and token counts for every chat model call, named by the
+    # run_name the caller passes in its config (answer, follow_up, rewrite_question, ...).
+    # Streamed completions report usage on their generation (see answering.StreamingUsageChatOpenAI);
+    # without it, completion tokens are counted as they arrive.
+    # Prompt and cached tokens are also totalled over the process, and every call logs OpenAI's prompt
+    # cache hit rate so far.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}  # run_id -> {"name", "span", "started", "first_token", "tokens"}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        name = kwargs.get("name") or "chat"
+        span = tracer.start_span(f"llm.{name}", attributes={"llm.call": name})
+        with self.lock:
+            self.calls[run_id] = {"name": name, "span": span, "started": time.perf_counter(), "first_token": None, "tokens": 0}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self.lock:
+            call = self.calls.get(run_id)
+            if call is None:
+                return
+            if call["first_token"] is None:
+                call["first_token"] = time.perf_counter()
+            call["tokens"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self.lock:
+            call = self.calls.pop(run_id, None)
+        if call is None:
+            return
+        name, span = call["name"], call["span"]
+        elapsed = time.perf_counter() - call["started"]
+
+        usage = (response.llm_output or {}).get("token_usage")
+        if not usage and response.generations and response.generations[0]:
+            usage = (response.generations[0][0].generation_info or {}).get("token_usage")
+        usage = usage or {}
+        tokens = {
+            "prompt": usage.get("prompt_tokens", 0),
+            "cached": (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0,
+            "completion": usage.get("completion_tokens", call["tokens"]),
+        }
+        with self.lock:
+            self.prompt_tokens += tokens["prompt"]
+            self.cached_tokens += tokens["cached"]
+            hit_rate = self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+        for kind, count in tokens.items():
+            if count:
+                llm_tokens.add(count, {"call": name, "kind": kind})
+            span.set_attribute(f"llm.tokens.{kind}", count)
+        if call["first_token"] is not None:
+            ttft = call["first_token"] - call["started"]
+            llm_time_to_first_token.record(ttft, {"call": name})
+            span.set_attribute("llm.time_to_first_token", ttft)
+        record_duration(f"llm.{name}", elapsed, {"error": False})
+        span.end()
+        logger.info("LLM %s: %.0f ms, %s prompt (%s cached) and %s completion tokens, prompt cache hit rate %.1f%%",
+                    name, elapsed * 1000, tokens["prompt"], tokens["cached"], tokens["completion"], hit_rate * 100)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            call = self.calls.pop(run_id, None)
+        if call is None:
+            return
+        record_duration(f"llm.{call['name']}", time.perf_counter() - call["started"], {"error": True})
+        call["span"].record_exception(error)
+        call["span"].set_status(Status(StatusCode.ERROR, str(error)))
+        call["span"].end()
+
+
+llm_call_telemetry = LLMCallTelemetry()
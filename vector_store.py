@@ -0,0 +1,153 @@
+import os
+import logging
+import hashlib
+import threading
+import chromadb
+from chromadb.config import Settings
+from chromadb.api.shared_system_client import SharedSystemClient
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from langchain_chroma import Chroma
+from embeddings import EMBEDDING_MODEL, get_embedding_function, get_document_embedding_function
+from pgvector_store import PgVectorStore, get_store_embedding_model
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# How many persona stores are kept open per process before the least recently used one is closed
+VECTOR_STORE_CACHE_SIZE = int(os.getenv("VECTOR_STORE_CACHE_SIZE", "16"))
+
+# "directory": one Chroma directory per persona, at the user's chroma_path.
+# "shared": every persona is a collection of one Chroma client at SHARED_CHROMA_PATH, so the
+# process keeps one database open and loads persona indexes on demand, within the memory limit.
+# "pgvector": every persona lives in PostgreSQL (see pgvector_store.py), shared by all app replicas.
+VECTOR_STORE_MODE = os.getenv("VECTOR_STORE_MODE", "directory")
+SHARED_CHROMA_PATH = os.getenv("SHARED_CHROMA_PATH", "/tmp/chroma/shared")
+SHARED_CHROMA_MEMORY_LIMIT = int(os.getenv("SHARED_CHROMA_MEMORY_LIMIT", str(2 * 1024 ** 3)))  # Bytes of loaded indexes
+
+# langchain_chroma's default collection, used by every persona directory
+COLLECTION_NAME = "langchain"
+# Stores created before the embedding model was recorded were all built with this one
+LEGACY_EMBEDDING_MODEL = "openai:text-embedding-ada-002"
+
+_lock = threading.RLock()
+_vector_dbs = OrderedDict()  # chroma_path -> Chroma, most recently used last
+_store_users = Counter()  # chroma_path -> threads in keep_store_open(), its client is not closed under them
+_shared_client = None
+
+
+def get_shared_collection_name(chroma_path):
+    # The chroma_path still identifies a persona in shared mode, it just no longer is a directory
+    return "persona-" + hashlib.sha1(chroma_path.encode("utf-8")).hexdigest()[:16]
+
+
+def get_collection_name(chroma_path):
+    if VECTOR_STORE_MODE == "shared":
+        return get_shared_collection_name(chroma_path)
+    return COLLECTION_NAME
+
+
+def get_chroma_client(chroma_path):
+    if VECTOR_STORE_MODE == "shared":
+        return get_shared_chroma_client()
+    return chromadb.PersistentClient(path=chroma_path)
+
+
+def get_shared_chroma_client():
+    global _shared_client
+    with _lock:
+        if _shared_client is None:
+            # Least recently used persona indexes are unloaded once the limit is reached
+            _shared_client = chromadb.PersistentClient(path=SHARED_CHROMA_PATH, settings=Settings(
+                chroma_segment_cache_policy="LRU",
+                chroma_memory_limit_bytes=SHARED_CHROMA_MEMORY_LIMIT,
+            ))
+        return _shared_client
+
+
+def open_vector_db(chroma_path, embedding_model=None, for_documents=False):
+    # Open a persona store with the embeddings it was built with. A new store is created with
+    # embedding_model (default EMBEDDING_MODEL) and records it in its collection metadata.
+    # for_documents=True uses the cached document embeddings, for imports.
+    if VECTOR_STORE_MODE == "pgvector":
+        store_embedding_model, dimension = get_store_embedding_model(chroma_path, embedding_model or EMBEDDING_MODEL)
+    else:
+        client = get_chroma_client(chroma_path)
+        collection_name = get_collection_name(chroma_path)
+        try:
+            collection = client.get_collection(collection_name)
+        except Exception:  # ValueError or InvalidCollectionException, depending on the chromadb version
+            # Only a new collection gets the metadata, an existing one keeps what it was built with
+            collection = client.get_or_create_collection(
+                collection_name, metadata={"embedding_model": embedding_model or EMBEDDING_MODEL}
+            )
+        store_embedding_model = (collection.metadata or {}).get("embedding_model", LEGACY_EMBEDDING_MODEL)
+    if embedding_model and embedding_model != store_embedding_model:
+        logger.warning("%s was built with %s, ignoring %s", chroma_path, store_embedding_model, embedding_model)
+
+    if for_documents:
+        embedding_function = get_document_embedding_function(store_embedding_model)
+    else:
+        embedding_function = get_embedding_function(store_embedding_model)
+    if VECTOR_STORE_MODE == "pgvector":
+        return PgVectorStore(chroma_path, embedding_function, store_embedding_model, dimension)
+    return Chroma(client=client, collection_name=collection_name, embedding_function=embedding_function)
+
+
+def get_vector_db(chroma_path):
+    # Open each persona store once and reuse it across turns and sessions
+    with _lock:
+        vector_db = _vector_dbs.get(chroma_path)
+        if vector_db is not None:
+            _vector_dbs.move_to_end(chroma_path)
+            return vector_db
+
+        logger.info("Opening vector store: %s", chroma_path)
+        vector_db = open_vector_db(chroma_path)
+        _vector_dbs[chroma_path] = vector_db
+
+        # Evict the least recently used stores
+        while len(_vector_dbs) > VECTOR_STORE_CACHE_SIZE:
+            evicted_path, _ = _vector_dbs.popitem(last=False)
+            logger.info("Evicted vector store: %s", evicted_path)
+            _close_unused_client(evicted_path)
+
+        return vector_db
+
+
+def evict_vector_db(chroma_path):
+    # Must be called whenever a store is rebuilt on disk (e.g. after a re-import)
+    with _lock:
+        _vector_dbs.pop(chroma_path, None)
+        _close_unused_client(chroma_path)
+
+
+@contextmanager
+def keep_store_open(chroma_path):
+    # Wrap any use of a persona store (a chat turn's retrieval, an import) so an eviction from
+    # another thread cannot close its client meanwhile. It is closed on exit if no longer cached.
+    with _lock:
+        _store_users[chroma_path] += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _store_users[chroma_path] -= 1
+            if not _store_users[chroma_path]:
+                del _store_users[chroma_path]
+                _close_unused_client(chroma_path)
+
+
+def _close_unused_client(chroma_path):
+    # chromadb keeps the system of every PersistentClient (sqlite connections, loaded HNSW segments)
+    # in a process-wide registry keyed by path, so dropping the Chroma object frees nothing. Called
+    # with _lock held. The shared client stays open, its segment cache bounds the loaded indexes.
+    if VECTOR_STORE_MODE != "directory" or chroma_path in _vector_dbs or chroma_path in _store_users:
+        return
+    system = SharedSystemClient._identifier_to_system.pop(chroma_path, None)
+    if system is not None:
+        system.stop()
+        logger.info("Closed vector store: %s", chroma_path)